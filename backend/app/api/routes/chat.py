@@ -1,15 +1,14 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Depends
 from fastapi.responses import StreamingResponse
 from typing import List, Dict, Any, Optional
-import asyncio
-import json
+import orjson
 from app.models.schemas import (
     ChatRequest, ChatResponse, UploadResponse, 
     AnalyticsRequest, AnalyticsResponse
 )
 from app.services.pdf_processor import MultimodalPDFProcessor
-from app.services.vector_store import MultimodalVectorStoreService
-from langchain_server.graphs.rag_graph import MultimodalRAGGraph
+from app.services.vector_store import MultimodalVectorStoreService, get_vector_store_service
+from langchain_server.graphs.rag_graph import get_rag_graph
 from app.core.config import settings
 import logging
 
@@ -18,8 +17,7 @@ router = APIRouter()
 
 # Global instances
 pdf_processor = MultimodalPDFProcessor()
-vector_service = MultimodalVectorStoreService()
-rag_graph = MultimodalRAGGraph()
+rag_graph = get_rag_graph()
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat_with_pdf(request: ChatRequest):
@@ -47,28 +45,9 @@ async def chat_with_pdf_stream(request: ChatRequest):
     """Streaming chat endpoint"""
     try:
         async def generate_stream():
-            # Process query through RAG graph
-            result = await rag_graph.process_query(request.query)
-            
-            # Stream response word by word
-            words = result["response"].split()
-            for i, word in enumerate(words):
-                chunk = {
-                    "type": "text",
-                    "content": word + " ",
-                    "is_final": i == len(words) - 1
-                }
-                yield f"data: {json.dumps(chunk)}\n\n"
-                await asyncio.sleep(0.05)  # Small delay for streaming effect
-            
-            # Send chart data if available
-            if result.get("chart_data"):
-                chart_chunk = {
-                    "type": "chart",
-                    "content": result["chart_data"],
-                    "is_final": True
-                }
-                yield f"data: {json.dumps(chart_chunk)}\n\n"
+            # Forward response text as the LLM produces it, then any chart
+            async for chunk in rag_graph.astream_query(request.query):
+                yield b"data: " + orjson.dumps(chunk) + b"\n\n"
         
         return StreamingResponse(
             generate_stream(),
@@ -102,7 +81,7 @@ async def upload_pdf(file: UploadFile = File(...)):
         processed_content = await pdf_processor.process_pdf(file_path)
         
         # Add to vector stores
-        await vector_service.add_multimodal_content(processed_content)
+        await MultimodalVectorStoreService().add_multimodal_content(processed_content)
         
         return UploadResponse(
             message="PDF uploaded and processed successfully",
@@ -122,8 +101,8 @@ async def analyze_trends(request: AnalyticsRequest):
     """Advanced analytics endpoint for trend analysis"""
     try:
         # Search for relevant table data
-        table_results = await vector_service.table_store.similarity_search(
-            request.query, k=10
+        table_results = await get_vector_store_service().similarity_search(
+            request.query, k=10, filter_dict={"content_type": "table"}
         )
         
         # Extract table data
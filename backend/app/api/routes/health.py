@@ -1,11 +1,11 @@
 from fastapi import APIRouter
 from app.services.health import health_service
 from app.monitoring.prometheus import get_metrics
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 
 router = APIRouter()
 
-@router.get("/health")
+@router.api_route("/health", methods=["GET", "HEAD"])
 async def health_check():
     """Basic health check"""
     return {"status": "healthy", "service": "multimodal-pdf-rag"}
@@ -18,19 +18,23 @@ async def detailed_health_check():
 @router.get("/health/ready")
 async def readiness_check():
     """Kubernetes readiness probe"""
+    # Not ready until the startup warm-up has run
+    if not health_service.ready:
+        return ORJSONResponse({"status": "not_ready"}, status_code=503)
+    
     health_status = await health_service.comprehensive_health_check()
     
     if health_status["overall_status"] in ["healthy", "degraded"]:
         return {"status": "ready"}
     else:
-        return {"status": "not_ready"}, 503
+        return ORJSONResponse({"status": "not_ready"}, status_code=503)
 
-@router.get("/health/live")
+@router.api_route("/health/live", methods=["GET", "HEAD"])
 async def liveness_check():
     """Kubernetes liveness probe"""
     return {"status": "alive"}
 
-@router.get("/metrics")
+@router.get("/health/metrics")
 async def prometheus_metrics():
     """Prometheus metrics endpoint"""
     return PlainTextResponse(get_metrics(), media_type="text/plain")
\ No newline at end of file
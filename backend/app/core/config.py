@@ -17,6 +17,10 @@ class Settings(BaseSettings):
     EURI_EMBEDDING_MODEL: str = "text-embedding-3-large"
     EURI_MAX_RETRIES: int = 3
     EURI_TIMEOUT: int = 30
+    MAX_CONCURRENT_LLM_CALLS: int = 8
+    LLM_BATCH_WINDOW_MS: int = 10  # Window for coalescing concurrent prompts
+    LLM_MAX_BATCH_SIZE: int = 32
+    LLM_NODE_TIMEOUT: int = 45  # Cap on one graph node's LLM call, retries included
     
     # Vector Database Configuration
     VECTOR_DB_TYPE: str = "chroma"  # or "faiss"
@@ -57,9 +61,16 @@ class Settings(BaseSettings):
     MAX_QUERY_LENGTH: int = 2000
     MAX_SOURCES_PER_QUERY: int = 20
     DEFAULT_K_SOURCES: int = 5
+    ANSWER_CACHE_SIZE: int = 1024
+    ANSWER_CACHE_TTL: int = 3600  # 1 hour
+    ANSWER_CACHE_THRESHOLD: float = 0.95  # Cosine similarity for a cache hit
     
     # Processing Limits
     MAX_CONCURRENT_UPLOADS: int = 5
+    PDF_PROCESS_WORKERS: Optional[int] = None  # Defaults to the container CPU quota
+    LANGSERVE_WORKERS: Optional[int] = None  # Defaults to server_workers(); one when DEBUG reloads
+    STORE_IMAGE_BLOBS: bool = False  # Keep base64 PNGs of extracted images
+    OCR_BACKEND: str = "tesseract"  # or "easyocr" (GPU, falls back to tesseract)
     PROCESSING_TIMEOUT: int = 1800  # 30 minutes
     
     # Monitoring Configuration
@@ -0,0 +1,38 @@
+from typing import Any, Coroutine, Optional, TypeVar
+import asyncio
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Process-wide event loop running in a daemon thread, shared by synchronous
+# chain calls and the LLM prompt batcher
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """Get the shared background event loop, starting it on first use"""
+    global _background_loop
+
+    with _background_loop_lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever,
+                name="background-event-loop",
+                daemon=True
+            ).start()
+            _background_loop = loop
+            logger.info("Started shared background event loop")
+
+    return _background_loop
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """Run a coroutine to completion from synchronous code
+
+    Unlike ``asyncio.run`` this reuses one long-lived loop and also works
+    when the caller is itself running inside an event loop.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_background_loop()).result()
@@ -0,0 +1,19 @@
+from pathlib import Path
+import os
+
+# cgroup v2 CPU limit of the container, as "<quota> <period>" or "max <period>"
+CGROUP_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+
+def cpu_quota() -> int:
+    """CPUs this process may use, honouring a container's CPU limit"""
+    try:
+        quota, period = CGROUP_CPU_MAX.read_text().split()
+        if quota != "max":
+            return max(1, int(quota) // int(period))
+    except (OSError, ValueError):
+        pass
+    return os.cpu_count() or 1
+
+def server_workers() -> int:
+    """Server worker processes matching the CPUs actually available"""
+    return max(2, min(8, 2 * cpu_quota() + 1))
@@ -1,7 +1,7 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from contextlib import asynccontextmanager
 import logging
 import sys
@@ -20,7 +20,7 @@ from app.core.exceptions import (
     llm_service_exception_handler, general_exception_handler
 )
 from app.api.routes import chat, upload, analytics, health
-from app.services.vector_store import MultimodalVectorStoreService
+from app.services.health import health_service
 from app.services.database import db_service
 from app.monitoring.prometheus import metrics_collector
 
@@ -34,16 +34,10 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info(f"Starting {settings.PROJECT_NAME} v{settings.VERSION}")
     
-    # Initialize services
+    # Only cheap setup happens before serving; slow initialization is
+    # deferred so the socket binds at once and readiness flips when done
+    warm_up_task = None
     try:
-        # Initialize database
-        logger.info("Initializing database...")
-        # Database tables are created automatically in db_service.__init__
-        
-        # Initialize vector store
-        logger.info("Initializing vector store...")
-        vector_service = MultimodalVectorStoreService()
-        
         # Create necessary directories
         settings.get_upload_path()
         settings.get_processed_path()
@@ -55,7 +49,8 @@ async def lifespan(app: FastAPI):
         else:
             logger.warning("EURI_API_KEY not configured")
         
-        logger.info("✅ All services initialized successfully")
+        logger.info("Initializing database and vector store in the background...")
+        warm_up_task = asyncio.create_task(health_service.warm_up())
         
         yield
         
@@ -65,6 +60,8 @@ async def lifespan(app: FastAPI):
     finally:
         # Shutdown
         logger.info("Shutting down services...")
+        if warm_up_task is not None and not warm_up_task.done():
+            warm_up_task.cancel()
 
 # Create FastAPI app
 app = FastAPI(
@@ -72,6 +69,7 @@ app = FastAPI(
     description=settings.DESCRIPTION,
     version=settings.VERSION,
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None,
 )
@@ -133,9 +131,10 @@ app.include_router(
     tags=["analytics"]
 )
 
+# Health routes carry their own /health paths so probes hit /health/live
+# and /health/ready, matching the rate-limit exemptions above
 app.include_router(
     health.router,
-    prefix="/health",
     tags=["health"]
 )
 
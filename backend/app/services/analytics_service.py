@@ -1,18 +1,40 @@
 import asyncio
 import pandas as pd
 from typing import List, Dict, Any, Optional, Tuple
-import json
 import logging
+import orjson
 import re
 from datetime import datetime, timedelta
 import numpy as np
 
-from app.services.llm_service import AdvancedLLMService
+from app.services.llm_service import AdvancedLLMService, parse_llm_json
 from app.services.vector_store import MultimodalVectorStoreService
 from langchain.schema import Document
 
 logger = logging.getLogger(__name__)
 
+# Thousands separators and currency signs dropped before parsing numbers
+_NUMERIC_STRIP = str.maketrans('', '', ',$')
+
+# Table values embedded in prompts may be NumPy scalars or use non-string keys
+_PROMPT_JSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def _prompt_json(value: Any, indent: bool = False) -> str:
+    """Serialize data for embedding in an LLM prompt"""
+    option = _PROMPT_JSON_OPTIONS | orjson.OPT_INDENT_2 if indent else _PROMPT_JSON_OPTIONS
+    return orjson.dumps(value, option=option, default=str).decode()
+
+# Query type keyword patterns, checked in order; the first match wins
+_QUERY_TYPE_PATTERNS = [
+    (query_type, re.compile("|".join(map(re.escape, keywords))))
+    for query_type, keywords in [
+        ("trend_analysis", ["trend", "over time", "timeline", "change", "growth"]),
+        ("comparison", ["compare", "vs", "versus", "difference", "between"]),
+        ("summary", ["summary", "overview", "summarize", "total", "average"]),
+        ("prediction", ["predict", "forecast", "future", "projection"]),
+    ]
+]
+
 class AnalyticsService:
     """Advanced analytics service for document data"""
     
@@ -58,7 +80,7 @@ class AnalyticsService:
                                 key, value = part.split(':', 1)
                                 # Try to convert to number
                                 try:
-                                    value = float(value.strip().replace(',', '').replace('$', ''))
+                                    value = float(value.strip().translate(_NUMERIC_STRIP))
                                 except:
                                     value = value.strip()
                                 record[key.strip()] = value
@@ -105,16 +127,11 @@ class AnalyticsService:
         """Classify the type of analytics query"""
         query_lower = query.lower()
         
-        if any(word in query_lower for word in ["trend", "over time", "timeline", "change", "growth"]):
-            return "trend_analysis"
-        elif any(word in query_lower for word in ["compare", "vs", "versus", "difference", "between"]):
-            return "comparison"
-        elif any(word in query_lower for word in ["summary", "overview", "summarize", "total", "average"]):
-            return "summary"
-        elif any(word in query_lower for word in ["predict", "forecast", "future", "projection"]):
-            return "prediction"
-        else:
-            return "general"
+        for query_type, pattern in _QUERY_TYPE_PATTERNS:
+            if pattern.search(query_lower):
+                return query_type
+        
+        return "general"
     
     async def _analyze_trends(
         self, 
@@ -205,7 +222,7 @@ class AnalyticsService:
         Query: {query}
         
         Data Statistics:
-        {json.dumps(stats, indent=2)}
+        {_prompt_json(stats, indent=True)}
         
         Context: {context}
         
@@ -274,7 +291,7 @@ class AnalyticsService:
             # Sample records
             sample_size = min(5, len(table_data))
             for i, record in enumerate(table_data[:sample_size]):
-                context_parts.append(f"Record {i+1}: {json.dumps(record)}")
+                context_parts.append(f"Record {i+1}: {_prompt_json(record)}")
             
             if len(table_data) > sample_size:
                 context_parts.append(f"... and {len(table_data) - sample_size} more records")
@@ -366,7 +383,7 @@ class AnalyticsService:
                         numeric_values.append(float(val))
                     else:
                         # Try to parse as number
-                        clean_val = str(val).replace(',', '').replace('$', '').strip()
+                        clean_val = str(val).translate(_NUMERIC_STRIP).strip()
                         numeric_values.append(float(clean_val))
                 except:
                     pass
@@ -407,7 +424,7 @@ class AnalyticsService:
             for record in data[:10]:
                 for value in record.values():
                     try:
-                        float(str(value).replace(',', '').replace('$', ''))
+                        float(str(value).translate(_NUMERIC_STRIP))
                         numeric_count += 1
                     except:
                         pass
@@ -448,9 +465,9 @@ class AnalyticsService:
         response = await self.llm_service.generate_response(insights_prompt)
         
         try:
-            insights = json.loads(response)
+            insights = parse_llm_json(response)
             return insights if isinstance(insights, list) else [response]
-        except:
+        except ValueError:
             # Fallback: extract insights manually
             return self._extract_insights_fallback(analysis)
     
@@ -521,7 +538,7 @@ class AnalyticsService:
             
             for key, value in sample_data.items():
                 try:
-                    float(str(value).replace(',', '').replace('$', ''))
+                    float(str(value).translate(_NUMERIC_STRIP))
                     numeric_cols.append(key)
                 except:
                     pass
@@ -533,7 +550,7 @@ class AnalyticsService:
                 
                 for item in sorted_data:
                     try:
-                        val = float(str(item["data"].get(col, 0)).replace(',', '').replace('$', ''))
+                        val = float(str(item["data"].get(col, 0)).translate(_NUMERIC_STRIP))
                         values.append(val)
                         dates.append(item["date"])
                     except:
@@ -609,10 +626,10 @@ class AnalyticsService:
         Compare these two datasets and answer: {query}
         
         Dataset A: {len(data_a)} records
-        Sample: {json.dumps(data_a[:3], indent=2) if data_a else "No data"}
+        Sample: {_prompt_json(data_a[:3], indent=True) if data_a else "No data"}
         
         Dataset B: {len(data_b)} records  
-        Sample: {json.dumps(data_b[:3], indent=2) if data_b else "No data"}
+        Sample: {_prompt_json(data_b[:3], indent=True) if data_b else "No data"}
         
         Provide:
         1. Key differences
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import StaticPool
 from app.core.config import settings
@@ -31,6 +31,11 @@ class DatabaseService:
         """Get database session"""
         return self.SessionLocal()
     
+    def ping(self) -> None:
+        """Run a trivial query on a pooled connection; raises if the database is unreachable"""
+        with self.engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    
     async def create_document(self, document_data: Dict[str, Any]) -> Document:
         """Create new document record"""
         with self.get_session() as db:
@@ -1,21 +1,204 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Sequence, Union
 from euriai import EuriaiClient
 from euriai.langchain_llm import EuriaiLangChainLLM
 from langchain.schema import BaseMessage, HumanMessage, SystemMessage
 from langchain.callbacks.base import BaseCallbackHandler
 from app.core.config import settings
+from app.core.event_loop import get_background_loop
 import logging
 import asyncio
+import re
+import string
+import threading
+from functools import lru_cache
+import orjson
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 logger = logging.getLogger(__name__)
 
-class LLMService:
-    def __init__(self):
-        self.client = EuriaiClient(
+_euri_client: Optional[EuriaiClient] = None
+
+# Process-wide cap on in-flight EURI requests to avoid rate-limit storms; only
+# acquired on the shared background loop, which it is bound to
+_llm_semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_LLM_CALLS)
+
+# Matches the outermost JSON object or array in a response wrapped in prose
+_JSON_BLOCK_PATTERN = re.compile(r"\{.*\}|\[.*\]", re.DOTALL)
+
+def parse_llm_json(response: str) -> Any:
+    """Parse JSON from an LLM response, tolerating surrounding prose"""
+    try:
+        return orjson.loads(response)
+    except orjson.JSONDecodeError:
+        match = _JSON_BLOCK_PATTERN.search(response)
+        if not match:
+            raise
+        return orjson.loads(match.group(0))
+
+_BASE_SYSTEM_PROMPT = """
+        You are an expert AI assistant specialized in analyzing PDF documents. 
+        You have access to multimodal content including text, tables, and images from the document.
+        
+        Guidelines:
+        1. Provide accurate, detailed responses based on the provided context
+        2. If asked about trends or data analysis, provide structured insights
+        3. Use specific page references when available
+        4. If information is not in the context, clearly state that
+        5. For numerical data, be precise and cite sources
+        6. Organize responses clearly with headers when appropriate
+        """
+
+# Compiled once; the static header comes first so prompts share a cacheable
+# prefix. Split around the context so its parts are joined straight in.
+_PROMPT_HEAD = string.Template("""
+        $header
+        
+        Context from PDF:
+        """)
+_PROMPT_TAIL = string.Template("""
+        
+        User Question: $query
+        
+        Please provide a comprehensive, accurate response based on the context provided.
+        If the question involves data analysis or trends, structure your response clearly.
+        """)
+
+@lru_cache(maxsize=64)
+def _prompt_head(system_message: str) -> str:
+    """System guidelines plus any caller instructions; callers reuse a few fixed messages"""
+    if not system_message:
+        header = _BASE_SYSTEM_PROMPT
+    else:
+        header = f"{_BASE_SYSTEM_PROMPT}\n\nAdditional instructions: {system_message}"
+    return _PROMPT_HEAD.substitute(header=header)
+
+def _parse_stream_chunk(line: str) -> str:
+    """Extract the text delta from one server-sent event line of a streamed completion"""
+    if line.startswith("data:"):
+        line = line[5:].strip()
+    if not line or line == "[DONE]":
+        return ""
+    
+    try:
+        payload = orjson.loads(line)
+    except orjson.JSONDecodeError:
+        return ""
+    
+    choices = payload.get("choices") if isinstance(payload, dict) else None
+    if not choices:
+        return ""
+    return (choices[0].get("delta") or {}).get("content") or ""
+
+# Marks the end of a streamed completion on the token queue
+_STREAM_END = object()
+
+def get_euri_client() -> EuriaiClient:
+    """Get the shared EURI AI client, creating it on first use"""
+    global _euri_client
+    if _euri_client is None:
+        _euri_client = EuriaiClient(
             api_key=settings.EURI_API_KEY,
             model=settings.EURI_MODEL
         )
+    return _euri_client
+
+def _release_llm_slot(call: asyncio.Future) -> None:
+    """Free a concurrency slot once its SDK call has actually finished"""
+    _llm_semaphore.release()
+    # Nobody awaits a call that outlived its timeout; consume its outcome
+    if not call.cancelled():
+        call.exception()
+
+async def _complete(prompt: str) -> str:
+    """Send one prompt to EURI AI under the shared concurrency cap"""
+    # The EURI SDK is synchronous; run it off the event loop
+    await _llm_semaphore.acquire()
+    call = asyncio.ensure_future(asyncio.to_thread(
+        get_euri_client().generate_completion,
+        prompt=prompt,
+        temperature=settings.TEMPERATURE,
+        max_tokens=settings.MAX_TOKENS
+    ))
+    # A timeout cannot stop the SDK's thread, so the slot stays taken until
+    # the thread returns rather than when this caller stops waiting
+    call.add_done_callback(_release_llm_slot)
+    return await asyncio.wait_for(asyncio.shield(call), timeout=settings.EURI_TIMEOUT)
+
+class _PromptBatcher:
+    """Coalesces prompts submitted within a short window into one dispatch
+    
+    The EURI completion API takes a single prompt, so a batch is sent as
+    concurrent requests; identical prompts in the same batch share one
+    request and its result.
+    """
+    
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self._dispatches = set()
+    
+    async def submit(self, prompt: str) -> str:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._collect())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((prompt, future))
+        return await future
+    
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        window = settings.LLM_BATCH_WINDOW_MS / 1000
+        
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + window
+            
+            while len(batch) < settings.LLM_MAX_BATCH_SIZE:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            # Dispatch in the background so the next window opens immediately
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+    
+    async def _dispatch(self, batch):
+        waiters: Dict[str, List[asyncio.Future]] = {}
+        for prompt, future in batch:
+            waiters.setdefault(prompt, []).append(future)
+        
+        results = await asyncio.gather(
+            *[_complete(prompt) for prompt in waiters],
+            return_exceptions=True
+        )
+        
+        for futures, result in zip(waiters.values(), results):
+            for future in futures:
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+# One batcher for the whole process, living on the shared background loop, so
+# prompts from the API, the graphs and the synchronous chains all coalesce
+_batcher = _PromptBatcher()
+
+async def _submit_prompt(prompt: str) -> str:
+    """Queue a prompt on the shared batcher from whichever loop the caller runs on"""
+    future = asyncio.run_coroutine_threadsafe(_batcher.submit(prompt), get_background_loop())
+    return await asyncio.wrap_future(future)
+
+class LLMService:
+    def __init__(self):
+        # All services share one client so connection setup happens once
+        self.client = get_euri_client()
         
         self.langchain_llm = EuriaiLangChainLLM(
             api_key=settings.EURI_API_KEY,
@@ -31,18 +214,15 @@ class LLMService:
     async def generate_response(
         self,
         prompt: str,
-        context: str = "",
+        context: Union[str, Sequence[str]] = "",
         system_message: str = ""
     ) -> str:
         """Generate response using EURI AI with retry logic"""
         try:
             full_prompt = self._build_prompt(prompt, context, system_message)
 
-            response = self.client.generate_completion(
-                prompt=full_prompt,
-                temperature=settings.TEMPERATURE,
-                max_tokens=settings.MAX_TOKENS
-            )
+            # Concurrent callers are coalesced into short dispatch windows
+            response = await _submit_prompt(full_prompt)
 
             return response
 
@@ -53,6 +233,62 @@ class LLMService:
                 logger.error(f"Full API error details: {e}")
             raise
     
+    async def stream_response(
+        self,
+        prompt: str,
+        context: Union[str, Sequence[str]] = "",
+        system_message: str = ""
+    ) -> AsyncIterator[str]:
+        """Stream response text from EURI AI as it is generated"""
+        full_prompt = self._build_prompt(prompt, context, system_message)
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        
+        def produce():
+            # The SDK streams with a blocking generator; forward chunks to the loop
+            try:
+                for line in self.client.stream_completion(
+                    prompt=full_prompt,
+                    temperature=settings.TEMPERATURE,
+                    max_tokens=settings.MAX_TOKENS
+                ):
+                    if stop.is_set():
+                        break
+                    token = _parse_stream_chunk(line)
+                    if token:
+                        loop.call_soon_threadsafe(queue.put_nowait, token)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+        
+        # Take a slot under the shared cap on the loop that owns the semaphore
+        background_loop = get_background_loop()
+        await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(_llm_semaphore.acquire(), background_loop)
+        )
+        producer = asyncio.create_task(asyncio.to_thread(produce))
+        # Released when the worker thread exits, which may be after this
+        # generator gives up on a stalled stream
+        producer.add_done_callback(
+            lambda _: background_loop.call_soon_threadsafe(_llm_semaphore.release)
+        )
+        try:
+            while True:
+                item = await asyncio.wait_for(queue.get(), timeout=settings.EURI_TIMEOUT)
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, Exception):
+                    logger.error(f"EURI AI streaming error: {str(item)}")
+                    raise item
+                yield item
+        finally:
+            # Let the worker thread exit early if the caller stops reading
+            stop.set()
+            if producer.done():
+                await producer
+    
     async def generate_with_langchain(
         self,
         messages: List[BaseMessage]
@@ -66,37 +302,28 @@ class LLMService:
             logger.error(f"Error generating LangChain response: {str(e)}")
             raise
     
-    def _build_prompt(self, query: str, context: str, system_message: str) -> str:
-        """Build comprehensive prompt for PDF Q&A"""
-        base_system = """
-        You are an expert AI assistant specialized in analyzing PDF documents. 
-        You have access to multimodal content including text, tables, and images from the document.
+    def _build_prompt(
+        self,
+        query: str,
+        context: Union[str, Sequence[str]],
+        system_message: str
+    ) -> str:
+        """Build comprehensive prompt for PDF Q&A
         
-        Guidelines:
-        1. Provide accurate, detailed responses based on the provided context
-        2. If asked about trends or data analysis, provide structured insights
-        3. Use specific page references when available
-        4. If information is not in the context, clearly state that
-        5. For numerical data, be precise and cite sources
-        6. Organize responses clearly with headers when appropriate
+        ``context`` may be a sequence of parts; they are newline-joined in the
+        same single join that assembles the prompt.
         """
+        if isinstance(context, str):
+            context = (context,)
         
-        if system_message:
-            base_system += f"\n\nAdditional instructions: {system_message}"
-        
-        prompt = f"""
-        {base_system}
-        
-        Context from PDF:
-        {context}
-        
-        User Question: {query}
-        
-        Please provide a comprehensive, accurate response based on the context provided.
-        If the question involves data analysis or trends, structure your response clearly.
-        """
+        pieces = [_prompt_head(system_message)]
+        for i, part in enumerate(context):
+            if i:
+                pieces.append("\n")
+            pieces.append(part)
+        pieces.append(_PROMPT_TAIL.substitute(query=query))
         
-        return prompt
+        return "".join(pieces)
 
 class AdvancedLLMService(LLMService):
     """Extended LLM service with advanced capabilities"""
@@ -162,8 +389,7 @@ class AdvancedLLMService(LLMService):
         response = await self.generate_response(chart_prompt)
         
         try:
-            import json
-            chart_spec = json.loads(response)
+            chart_spec = parse_llm_json(response)
             return chart_spec
         except:
             # Fallback if JSON parsing fails
@@ -173,29 +399,69 @@ class AdvancedLLMService(LLMService):
                 "description": "Generated chart based on query"
             }
     
+    async def analyze_query_meta(self, query: str) -> Dict[str, Any]:
+        """Detect query intent and modality relevance with a single LLM call"""
+        
+        meta_prompt = f"""
+        Analyze this query: "{query}"
+        
+        1. Classify the user's intent.
+        2. Rate the relevance of each content type from 0.0 to 1.0:
+           Text content: written descriptions, explanations, narratives
+           Table/Data content: numbers, statistics, comparisons, trends
+           Image content: visual elements, diagrams, charts, photos
+        
+        Return as JSON:
+        {{
+            "intent": {{
+                "primary_intent": "question_answering|data_analysis|summarization|comparison|visualization",
+                "requires_calculations": true/false,
+                "requires_visualization": true/false,
+                "complexity": "simple|moderate|complex",
+                "expected_response_type": "text|table|chart|multimodal",
+                "key_entities": ["entity1", "entity2"],
+                "temporal_aspect": true/false
+            }},
+            "modality_relevance": {{
+                "text": 0.0-1.0,
+                "table": 0.0-1.0,
+                "image": 0.0-1.0
+            }}
+        }}
+        """
+        
+        response = await self.generate_response(meta_prompt)
+        
+        try:
+            meta = parse_llm_json(response)
+            return meta if isinstance(meta, dict) else {}
+        except Exception as e:
+            logger.warning(f"Error parsing query metadata: {str(e)}")
+            return {}
+    
     def _format_tables_for_analysis(self, tables: List[Dict[str, Any]]) -> str:
         """Format table data for LLM analysis"""
         formatted_tables = []
         
         for i, table in enumerate(tables):
-            table_text = f"Table {i+1}:\n"
+            table_lines = [f"Table {i+1}:\n"]
             
             if isinstance(table, dict) and "content" in table:
                 content = table["content"]
                 if isinstance(content, list) and content:
                     # Get headers
                     headers = list(content[0].keys())
-                    table_text += f"Columns: {', '.join(headers)}\n"
+                    table_lines.append(f"Columns: {', '.join(headers)}\n")
                     
                     # Add sample rows
                     for j, row in enumerate(content[:5]):  # First 5 rows
                         row_text = " | ".join([f"{k}: {v}" for k, v in row.items()])
-                        table_text += f"Row {j+1}: {row_text}\n"
+                        table_lines.append(f"Row {j+1}: {row_text}\n")
                     
                     if len(content) > 5:
-                        table_text += f"... and {len(content) - 5} more rows\n"
+                        table_lines.append(f"... and {len(content) - 5} more rows\n")
             
-            formatted_tables.append(table_text)
+            formatted_tables.append("".join(table_lines))
         
         return "\n\n".join(formatted_tables)
     
@@ -2,16 +2,30 @@ import asyncio
 from typing import List, Dict, Any, Optional, Tuple
 import logging
 import base64
+import re
 from io import BytesIO
 import numpy as np
 from PIL import Image
 import cv2
 
-from app.services.llm_service import AdvancedLLMService
+from app.services.llm_service import AdvancedLLMService, parse_llm_json
 from langchain.schema import Document
 
 logger = logging.getLogger(__name__)
 
+# Keyword sets shared by the fallback intent analysis and modality scoring
+_ANALYSIS_KEYWORDS = frozenset(["analyze", "trend", "pattern", "statistics"])
+_CALCULATION_KEYWORDS = frozenset(["calculate", "sum", "average", "total", "percentage", "growth"])
+_VISUALIZATION_KEYWORDS = frozenset(["chart", "graph", "plot", "visualize"])
+
+# Keywords that make a modality clearly relevant without asking the LLM
+_TABLE_KEYWORDS = _ANALYSIS_KEYWORDS | _CALCULATION_KEYWORDS
+_IMAGE_KEYWORDS = _VISUALIZATION_KEYWORDS
+_TOKEN_PATTERN = re.compile(r"[a-z]+")
+
+# Thousands separators and currency signs dropped before parsing numbers
+_NUMERIC_STRIP = str.maketrans('', '', ',$')
+
 class MultimodalProcessor:
     """Advanced multimodal processing for complex document analysis"""
     
@@ -23,12 +37,15 @@ class MultimodalProcessor:
         query: str,
         text_docs: List[Document],
         table_docs: List[Document],
-        image_docs: List[Document]
+        image_docs: List[Document],
+        modality_relevance: Optional[Dict[str, float]] = None
     ) -> Dict[str, Any]:
         """Process query across all modalities"""
         
-        # Analyze which modalities are most relevant
-        modality_relevance = await self._analyze_modality_relevance(query)
+        # Analyze which modalities are most relevant, unless the caller
+        # already obtained the scores from analyze_query
+        if modality_relevance is None:
+            modality_relevance = await self._analyze_modality_relevance(query)
         
         # Process each modality based on relevance
         results = {}
@@ -54,6 +71,11 @@ class MultimodalProcessor:
     async def _analyze_modality_relevance(self, query: str) -> Dict[str, float]:
         """Determine which modalities are most relevant for the query"""
         
+        # Cheap keyword scoring settles most queries without an LLM round trip
+        scores, confidence = self._score_modalities(query)
+        if confidence > 0.3:
+            return scores
+        
         relevance_prompt = f"""
         Analyze this query and determine the relevance of different content types:
         
@@ -76,22 +98,69 @@ class MultimodalProcessor:
         response = await self.llm_service.generate_response(relevance_prompt)
         
         try:
-            import json
-            relevance = json.loads(response)
-            
-            # Ensure all values are between 0 and 1
-            for key in ["text", "table", "image"]:
-                if key not in relevance:
-                    relevance[key] = 0.5
-                relevance[key] = max(0.0, min(1.0, float(relevance[key])))
-            
-            return relevance
+            return self._normalize_relevance(parse_llm_json(response))
             
         except Exception as e:
             logger.warning(f"Error parsing modality relevance: {str(e)}")
             # Default relevance
             return {"text": 0.6, "table": 0.7, "image": 0.4}
     
+    def _score_modalities(self, query: str) -> Tuple[Dict[str, float], float]:
+        """Score modality relevance from keywords, with a confidence margin"""
+        
+        terms = set(_TOKEN_PATTERN.findall(query.lower()))
+        table_hits = len(terms & _TABLE_KEYWORDS)
+        image_hits = len(terms & _IMAGE_KEYWORDS)
+        
+        scores = {
+            "text": 0.4 if table_hits or image_hits else 0.5,
+            "table": min(1.0, 0.3 + 0.5 * table_hits),
+            "image": min(1.0, 0.3 + 0.5 * image_hits)
+        }
+        
+        # Confidence is the margin between the best and second-best modality
+        ranked = sorted(scores.values(), reverse=True)
+        return scores, ranked[0] - ranked[1]
+    
+    def _normalize_relevance(self, relevance: Dict[str, Any]) -> Dict[str, float]:
+        """Fill in missing modalities and clamp scores to [0, 1]"""
+        
+        # Ensure all values are between 0 and 1
+        for key in ["text", "table", "image"]:
+            if key not in relevance:
+                relevance[key] = 0.5
+            relevance[key] = max(0.0, min(1.0, float(relevance[key])))
+        
+        return relevance
+    
+    async def analyze_query(self, query: str) -> Dict[str, Any]:
+        """Detect intent and modality relevance in one LLM round trip"""
+        
+        # Queries the keywords settle clearly skip the LLM round trip
+        scores, confidence = self._score_modalities(query)
+        if confidence > 0.3:
+            return {
+                "intent": self._analyze_intent_fallback(query),
+                "modality_relevance": scores
+            }
+        
+        meta = await self.llm_service.analyze_query_meta(query)
+        
+        intent = meta.get("intent")
+        if not isinstance(intent, dict) or not intent:
+            intent = self._analyze_intent_fallback(query)
+        
+        try:
+            relevance = self._normalize_relevance(dict(meta["modality_relevance"]))
+        except Exception as e:
+            logger.warning(f"Error parsing modality relevance: {str(e)}")
+            relevance = {"text": 0.6, "table": 0.7, "image": 0.4}
+        
+        return {
+            "intent": intent,
+            "modality_relevance": relevance
+        }
+    
     async def _process_text_modality(
         self, 
         query: str, 
@@ -99,14 +168,23 @@ class MultimodalProcessor:
     ) -> Dict[str, Any]:
         """Process text-based documents"""
         
-        # Combine and summarize text content
-        combined_text = "\n\n".join([doc.page_content for doc in text_docs[:5]])
+        # Combine text content within a 3000 character budget for token
+        # efficiency, without materializing the full concatenation first
+        text_parts = []
+        remaining = 3000
+        for doc in text_docs[:5]:
+            chunk = doc.page_content[:remaining]
+            text_parts.append(chunk)
+            remaining -= len(chunk) + 2
+            if remaining <= 0:
+                break
+        combined_text = "\n\n".join(text_parts)
         
         text_prompt = f"""
         Based on the following text content, answer this question: {query}
         
         Text Content:
-        {combined_text[:3000]}  # Limit for token efficiency
+        {combined_text}
         
         Provide a comprehensive answer based solely on the text content.
         Include relevant quotes and page references where available.
@@ -172,8 +250,11 @@ class MultimodalProcessor:
         
         image_analyses = []
         
+        # Tokenize the query once for all relevance calculations
+        query_terms = frozenset(query.lower().split())
+        
         for doc in image_docs:
-            analysis = await self._analyze_single_image(query, doc)
+            analysis = await self._analyze_single_image(query, doc, query_terms)
             if analysis:
                 image_analyses.append(analysis)
         
@@ -201,7 +282,8 @@ class MultimodalProcessor:
     async def _analyze_single_image(
         self, 
         query: str, 
-        image_doc: Document
+        image_doc: Document,
+        query_terms: frozenset
     ) -> Optional[Dict[str, Any]]:
         """Analyze a single image document"""
         
@@ -230,25 +312,19 @@ class MultimodalProcessor:
                 "page_number": page_number,
                 "ocr_text": ocr_text,
                 "description": description,
-                "relevance": self._calculate_image_relevance(query, ocr_text, description)
+                "relevance": self._calculate_image_relevance(query_terms, ocr_text, description)
             }
             
         except Exception as e:
             logger.warning(f"Error analyzing image: {str(e)}")
             return None
     
-    def _calculate_image_relevance(self, query: str, ocr_text: str, description: str) -> float:
+    def _calculate_image_relevance(self, query_terms: frozenset, ocr_text: str, description: str) -> float:
         """Calculate how relevant an image is to the query"""
         
-        query_terms = set(query.lower().split())
-        
-        # Check OCR text relevance
-        ocr_terms = set(ocr_text.lower().split()) if ocr_text else set()
-        ocr_overlap = len(query_terms.intersection(ocr_terms))
-        
-        # Check description relevance
-        desc_terms = set(description.lower().split())
-        desc_overlap = len(query_terms.intersection(desc_terms))
+        # Intersect against the token stream directly; only matches are stored
+        ocr_overlap = len(query_terms.intersection(ocr_text.lower().split())) if ocr_text else 0
+        desc_overlap = len(query_terms.intersection(description.lower().split()))
         
         # Calculate relevance score
         max_overlap = len(query_terms)
@@ -268,22 +344,22 @@ class MultimodalProcessor:
         if not results:
             return "No relevant content found to answer the query."
         
-        synthesis_prompt = f"""
+        prompt_parts = [f"""
         Synthesize information from multiple sources to answer: {query}
         
         Available Information:
-        """
+        """]
         
         if "text" in results:
-            synthesis_prompt += f"\nText Analysis: {results['text']['response']}\n"
+            prompt_parts.append(f"\nText Analysis: {results['text']['response']}\n")
         
         if "table" in results:
-            synthesis_prompt += f"\nData Analysis: {results['table']['response']}\n"
+            prompt_parts.append(f"\nData Analysis: {results['table']['response']}\n")
         
         if "image" in results:
-            synthesis_prompt += f"\nImage Analysis: {results['image']['response']}\n"
+            prompt_parts.append(f"\nImage Analysis: {results['image']['response']}\n")
         
-        synthesis_prompt += """
+        prompt_parts.append("""
         
         Provide a comprehensive, unified answer that:
         1. Directly addresses the query
@@ -293,8 +369,9 @@ class MultimodalProcessor:
         5. Provides confidence level in the answer
         
         Be thorough but concise.
-        """
+        """)
         
+        synthesis_prompt = "".join(prompt_parts)
         synthesis = await self.llm_service.generate_response(synthesis_prompt)
         
         return synthesis
@@ -305,9 +382,13 @@ class MultimodalProcessor:
         if not table_data:
             return {}
         
+        columns = set()
+        for record in table_data:
+            columns.update(record)
+        
         stats = {
             "total_records": len(table_data),
-            "columns": list(set().union(*(d.keys() for d in table_data))),
+            "columns": list(columns),
             "numeric_summaries": {}
         }
         
@@ -323,7 +404,7 @@ class MultimodalProcessor:
                         if isinstance(value, (int, float)):
                             numeric_values.append(float(value))
                         else:
-                            clean_val = str(value).replace(',', '').replace('$', '').strip()
+                            clean_val = str(value).translate(_NUMERIC_STRIP).strip()
                             numeric_values.append(float(clean_val))
                     except:
                         pass
@@ -387,8 +468,7 @@ class MultimodalProcessor:
         response = await self.llm_service.generate_response(intent_prompt)
         
         try:
-            import json
-            intent = json.loads(response)
+            intent = parse_llm_json(response)
             return intent
         except:
             # Fallback intent analysis
@@ -402,23 +482,22 @@ class MultimodalProcessor:
         # Determine primary intent
         if any(word in query_lower for word in ["what", "how", "why", "explain", "describe"]):
             primary_intent = "question_answering"
-        elif any(word in query_lower for word in ["analyze", "trend", "pattern", "statistics"]):
+        elif any(word in query_lower for word in _ANALYSIS_KEYWORDS):
             primary_intent = "data_analysis"
         elif any(word in query_lower for word in ["summary", "summarize", "overview"]):
             primary_intent = "summarization"
         elif any(word in query_lower for word in ["compare", "vs", "versus", "difference"]):
             primary_intent = "comparison"
-        elif any(word in query_lower for word in ["chart", "graph", "plot", "visualize"]):
+        elif any(word in query_lower for word in _VISUALIZATION_KEYWORDS):
             primary_intent = "visualization"
         else:
             primary_intent = "question_answering"
         
         # Detect other aspects
-        requires_calculations = any(word in query_lower for word in 
-                                 ["calculate", "sum", "average", "total", "percentage", "growth"])
+        requires_calculations = any(word in query_lower for word in _CALCULATION_KEYWORDS)
         
         requires_visualization = any(word in query_lower for word in 
-                                   ["chart", "graph", "plot", "visualize", "show", "trend"])
+                                   _VISUALIZATION_KEYWORDS | {"show", "trend"})
         
         temporal_aspect = any(word in query_lower for word in 
                              ["time", "year", "month", "date", "timeline", "over time"])
@@ -1,28 +1,379 @@
 import os
+import re
+import math
 import asyncio
-from typing import List, Dict, Any, Tuple
+import multiprocessing
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, Optional, Callable
 import pandas as pd
 import fitz  # PyMuPDF
-import pytesseract
-from PIL import Image
 import cv2
 import numpy as np
 from pdfplumber import PDF
 import camelot
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-import base64
+import pybase64
 from io import BytesIO
+from collections import deque
 import logging
 
+from app.core.config import settings
+from app.core.workers import cpu_quota
+
 logger = logging.getLogger(__name__)
 
+# Pages handed to a worker per task, amortizing pickling and dispatch overhead
+PAGE_BLOCK_SIZE = 10
+
+def _get_max_workers(page_count: int) -> int:
+    """Get the number of worker processes for page-level extraction
+
+    Capped by the container's CPU quota and by the number of page blocks,
+    since a pool starts all of its workers up front.
+    """
+    page_blocks = math.ceil(page_count / PAGE_BLOCK_SIZE)
+    return min(settings.PDF_PROCESS_WORKERS or cpu_quota(), page_blocks)
+
+# Minimum vector drawings on a page before it is treated as a ruled table
+LATTICE_DRAWING_THRESHOLD = 5
+
+# Images smaller than this (in pixels) are OCR'd without binarization
+OCR_MIN_THRESHOLD_AREA = 100 * 100
+
+# Separator between images in batched Tesseract output
+OCR_PAGE_SEPARATOR = "###PAGE###"
+
+# EasyOCR resizes every image to this square input so batches stack evenly
+EASYOCR_INPUT_SIZE = 1024
+EASYOCR_BATCH_SIZE = 16
+
+# Sentinel for a tesseract lookup that has not run yet
+_UNCHECKED = object()
+
+# Document opened once per worker process by _init_worker
+_worker_doc = None
+
+# EasyOCR reader loaded on first use; None when the backend is unavailable
+_easyocr_reader = _UNCHECKED
+
+def _init_worker(pdf_bytes: bytes) -> None:
+    """Open the in-memory PDF once per worker process
+
+    PyMuPDF documents are not fork-safe, so each worker opens its own.
+    """
+    global _worker_doc
+    _worker_doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+
+def _run_in_worker(func: Callable[..., List[Dict[str, Any]]], page_numbers: List[int], *args) -> List[Dict[str, Any]]:
+    """Apply a page-block function to the worker's document"""
+    return func(_worker_doc, page_numbers, *args)
+
+def _read_page_tables(pages: List[Tuple[int, str, str]]) -> List[Tuple[int, str, pd.DataFrame, Optional[float]]]:
+    """Run Camelot over a block of single-page PDF files
+
+    Each entry is ``(page_num, page_path, flavor)``; returns the non-empty
+    tables found as ``(page_num, flavor, df, accuracy)``.
+    """
+    results = []
+    
+    for page_num, page_path, flavor in pages:
+        for table in camelot.read_pdf(page_path, pages='1', flavor=flavor):
+            if table.df is not None and not table.df.empty:
+                results.append((page_num, flavor, table.df, getattr(table, 'accuracy', None)))
+    
+    return results
+
+def _process_page_text(doc, page_numbers: List[int]) -> List[Dict[str, Any]]:
+    """Extract text blocks with their bounding boxes from a block of pages"""
+    text_content = []
+    
+    for page_num in page_numbers:
+        page = doc[page_num]
+        page_rect = page.rect
+        
+        # PyMuPDF segments the page into coherent blocks for us
+        for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks"):
+            # Skip image blocks and text positioned entirely off the page
+            if block_type != 0 or not text.strip():
+                continue
+            if x1 <= page_rect.x0 or x0 >= page_rect.x1 or y1 <= page_rect.y0 or y0 >= page_rect.y1:
+                continue
+            
+            text_content.append({
+                "content": text,
+                "page_number": page_num + 1,
+                "content_type": "text",
+                "bbox": (x0, y0, x1, y1)
+            })
+    
+    return text_content
+
+def _process_page_images(
+    doc,
+    page_numbers: List[int],
+    first_refs: Dict[int, Tuple[int, int]],
+    store_blobs: bool = False
+) -> List[Dict[str, Any]]:
+    """Extract images from a block of pages
+
+    Only the first reference to each xref (per ``first_refs``) is rendered;
+    later references are emitted without pixels and resolved by
+    ``_extract_images``. Rendered images carry raw grayscale ``pixels`` for
+    OCR, which runs afterwards in a single batch (see ``_ocr_image_batch``);
+    a base64 PNG is only encoded when ``store_blobs`` is set.
+    """
+    images = []
+    
+    for page_num in page_numbers:
+        page = doc[page_num]
+        image_list = page.get_images()
+        
+        for img_index, img in enumerate(image_list):
+            xref = img[0]
+            image = {
+                "page_number": page_num + 1,
+                "content_type": "image",
+                "image_id": f"img_{page_num}_{img_index}",
+                "xref": xref
+            }
+            
+            # Logos and watermarks repeat across pages; render them once
+            if first_refs.get(xref, (page_num, img_index)) != (page_num, img_index):
+                images.append(image)
+                continue
+            
+            try:
+                # Extract image
+                pix = fitz.Pixmap(doc, xref)
+                
+                if pix.n - pix.alpha < 4:  # GRAY or RGB
+                    # OCR reads the raw samples, skipping a PNG round trip
+                    opaque = fitz.Pixmap(pix, 0) if pix.alpha else pix
+                    gray = opaque if opaque.n == 1 else fitz.Pixmap(fitz.csGRAY, opaque)
+                    image["pixels"] = np.frombuffer(gray.samples, dtype=np.uint8).reshape(gray.height, gray.width)
+                    image["size"] = (pix.width, pix.height)
+                    
+                    if store_blobs:
+                        image["content"] = pybase64.b64encode_as_string(pix.tobytes("png"))
+                    
+                    images.append(image)
+                
+                pix = None
+            
+            except Exception as e:
+                logger.warning(f"Error extracting image {img_index} from page {page_num}: {str(e)}")
+    
+    return images
+
+def _preprocess_for_ocr(gray: np.ndarray) -> np.ndarray:
+    """Binarize a grayscale image with adaptive thresholding for OCR
+
+    Tiny icons are returned as-is.
+    """
+    if gray.shape[0] * gray.shape[1] < OCR_MIN_THRESHOLD_AREA:
+        return gray
+    
+    return cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10
+    )
+
+def _ocr_image_batch(tesseract_path: str, images: List[np.ndarray]) -> List[str]:
+    """OCR a batch of grayscale images with a single Tesseract invocation
+
+    Starting Tesseract and loading its model once for the whole batch is
+    much cheaper than one process per image.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        image_paths = []
+        for i, gray in enumerate(images):
+            # Pre-binarized images let Tesseract skip its own thresholding;
+            # uncompressed PGM is cheaper to write than an encoded format
+            image_path = os.path.join(tmp_dir, f"img_{i}.pgm")
+            cv2.imwrite(image_path, _preprocess_for_ocr(gray))
+            image_paths.append(image_path)
+        
+        list_path = os.path.join(tmp_dir, "list.txt")
+        with open(list_path, "w") as f:
+            f.write("\n".join(image_paths))
+        
+        output_base = os.path.join(tmp_dir, "out")
+        subprocess.run(
+            [tesseract_path, list_path, output_base, "-c", f"page_separator={OCR_PAGE_SEPARATOR}"],
+            capture_output=True,
+            check=True,
+            # One OpenMP thread per Tesseract instance avoids oversubscription
+            env={**os.environ, "OMP_THREAD_LIMIT": "1"}
+        )
+        
+        with open(output_base + ".txt", encoding="utf-8") as f:
+            ocr_output = f.read()
+    
+    ocr_texts = [text.strip() for text in ocr_output.split(OCR_PAGE_SEPARATOR)]
+    
+    # Tesseract may emit a trailing separator after the last image
+    if len(ocr_texts) == len(images) + 1 and not ocr_texts[-1]:
+        ocr_texts.pop()
+    
+    if len(ocr_texts) != len(images):
+        raise ValueError(f"Expected OCR output for {len(images)} images, got {len(ocr_texts)}")
+    
+    return ocr_texts
+
+def _get_easyocr_reader():
+    """Load and warm up the EasyOCR reader once per process
+
+    Returns None when easyocr is not installed or fails to load, in which
+    case callers fall back to Tesseract.
+    """
+    global _easyocr_reader
+    if _easyocr_reader is not _UNCHECKED:
+        return _easyocr_reader
+    
+    try:
+        import easyocr
+        
+        reader = easyocr.Reader(['en'], gpu=True, cudnn_benchmark=True)
+        # The first batch pays for CUDA kernel selection; do it up front
+        reader.readtext_batched(
+            [np.zeros((EASYOCR_INPUT_SIZE, EASYOCR_INPUT_SIZE), dtype=np.uint8)],
+            n_width=EASYOCR_INPUT_SIZE,
+            n_height=EASYOCR_INPUT_SIZE,
+            detail=0
+        )
+        _easyocr_reader = reader
+    except Exception as e:
+        logger.warning(f"EasyOCR unavailable, falling back to Tesseract: {str(e)}")
+        _easyocr_reader = None
+    
+    return _easyocr_reader
+
+def _ocr_images_easyocr(reader, images: List[np.ndarray]) -> List[str]:
+    """OCR grayscale images in fixed-size GPU batches with EasyOCR"""
+    ocr_texts = []
+    
+    for i in range(0, len(images), EASYOCR_BATCH_SIZE):
+        results = reader.readtext_batched(
+            images[i:i + EASYOCR_BATCH_SIZE],
+            n_width=EASYOCR_INPUT_SIZE,
+            n_height=EASYOCR_INPUT_SIZE,
+            batch_size=EASYOCR_BATCH_SIZE,
+            detail=0
+        )
+        ocr_texts.extend(" ".join(lines).strip() for lines in results)
+    
+    return ocr_texts
+
+class _CachedTextSplitter(RecursiveCharacterTextSplitter):
+    """Recursive splitter that compiles its separators once and measures each split once"""
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Split patterns per separator, compiled up front rather than per call
+        self._separator_patterns = {
+            separator: re.compile(f"({re.escape(separator)})")
+            for separator in self._separators if separator
+        }
+    
+    def _split_text(self, text: str, separators: List[str]) -> List[str]:
+        """Split text on the first separator present, recursing into oversized pieces"""
+        if self._is_separator_regex:
+            return super()._split_text(text, separators)
+        
+        # Plain substring checks find the highest-priority separator in the text
+        separator = separators[-1]
+        new_separators = []
+        for i, candidate in enumerate(separators):
+            if candidate == "":
+                separator = candidate
+                break
+            if candidate in text:
+                separator = candidate
+                new_separators = separators[i + 1:]
+                break
+        
+        splits = self._split_on_separator(text, separator)
+        merge_separator = "" if self._keep_separator else separator
+        
+        final_chunks = []
+        good_splits = []
+        for split in splits:
+            if self._length_function(split) < self._chunk_size:
+                good_splits.append(split)
+                continue
+            
+            if good_splits:
+                final_chunks.extend(self._merge_splits(good_splits, merge_separator))
+                good_splits = []
+            if not new_separators:
+                final_chunks.append(split)
+            else:
+                final_chunks.extend(self._split_text(split, new_separators))
+        
+        if good_splits:
+            final_chunks.extend(self._merge_splits(good_splits, merge_separator))
+        return final_chunks
+    
+    def _split_on_separator(self, text: str, separator: str) -> List[str]:
+        """Split text on a literal separator with its precompiled pattern"""
+        if not separator:
+            return list(text)
+        
+        pattern = self._separator_patterns.get(separator)
+        if pattern is None:
+            pattern = self._separator_patterns[separator] = re.compile(f"({re.escape(separator)})")
+        
+        # The capture group keeps separators at odd indices
+        parts = pattern.split(text)
+        if self._keep_separator:
+            splits = [parts[0]] + [parts[i] + parts[i + 1] for i in range(1, len(parts), 2)]
+        else:
+            splits = parts[::2]
+        return [split for split in splits if split != ""]
+    
+    def _merge_splits(self, splits, separator: str) -> List[str]:
+        """Merge splits into chunks, tracking a running length instead of re-measuring"""
+        separator_len = self._length_function(separator)
+        lengths = [self._length_function(split) for split in splits]
+        
+        docs = []
+        current_doc = deque()
+        current_lengths = deque()
+        total = 0
+        for split, split_len in zip(splits, lengths):
+            if total + split_len + (separator_len if current_doc else 0) > self._chunk_size:
+                if total > self._chunk_size:
+                    logger.warning(f"Created a chunk of size {total}, which is longer than the specified {self._chunk_size}")
+                if current_doc:
+                    doc = self._join_docs(list(current_doc), separator)
+                    if doc is not None:
+                        docs.append(doc)
+                    # Drop leading splits until only the overlap remains
+                    while total > self._chunk_overlap or (
+                        total + split_len + (separator_len if current_doc else 0) > self._chunk_size and total > 0
+                    ):
+                        total -= current_lengths.popleft() + (separator_len if len(current_doc) > 1 else 0)
+                        current_doc.popleft()
+            current_doc.append(split)
+            current_lengths.append(split_len)
+            total += split_len + (separator_len if len(current_doc) > 1 else 0)
+        
+        doc = self._join_docs(list(current_doc), separator)
+        if doc is not None:
+            docs.append(doc)
+        return docs
+
 class MultimodalPDFProcessor:
+    # Resolved tesseract binary, shared by all instances; None when unavailable
+    _tesseract_path: Optional[str] = _UNCHECKED
+    
     def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.tesseract_path = 'tesseract'  # Default path, will be updated by _check_tesseract_available
-        self.text_splitter = RecursiveCharacterTextSplitter(
+        self.text_splitter = _CachedTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
             separators=["\n\n", "\n", " ", ""]
@@ -33,17 +384,48 @@ class MultimodalPDFProcessor:
         try:
             logger.info(f"Starting PDF processing: {pdf_path}")
             
-            # Extract different content types
-            text_content = await self._extract_text_content(pdf_path)
-            table_content = await self._extract_tables(pdf_path)
-            image_content = await self._extract_images(pdf_path)
+            # Read the file once; every parser works from the in-memory copy
+            with open(pdf_path, 'rb', buffering=1 << 16) as f:
+                pdf_bytes = f.read()
+            
+            # Open the PDF once and share it across all extraction passes
+            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+            
+            try:
+                metadata = await self._extract_metadata(doc, len(pdf_bytes))
+                
+                # Text, image and table extraction are CPU-bound per page, so fan the
+                # pages out across worker processes; a single block runs inline
+                max_workers = _get_max_workers(len(doc))
+                if max_workers <= 1:
+                    text_content, image_content, table_content = await asyncio.gather(
+                        self._extract_text_content(doc),
+                        self._extract_images(doc),
+                        self._extract_tables(doc, pdf_bytes)
+                    )
+                else:
+                    # Forkserver children start clean instead of copying this
+                    # process with its event loop and worker threads
+                    with ProcessPoolExecutor(
+                        max_workers=max_workers,
+                        mp_context=multiprocessing.get_context("forkserver"),
+                        initializer=_init_worker,
+                        initargs=(pdf_bytes,)
+                    ) as executor:
+                        text_content, image_content, table_content = await asyncio.gather(
+                            self._extract_text_content(doc, executor),
+                            self._extract_images(doc, executor),
+                            self._extract_tables(doc, pdf_bytes, executor)
+                        )
+            finally:
+                doc.close()
             
             # Process and chunk content
             processed_content = {
                 "text_chunks": self._chunk_text_content(text_content),
                 "tables": table_content,
                 "images": image_content,
-                "metadata": await self._extract_metadata(pdf_path)
+                "metadata": metadata
             }
             
             logger.info(f"PDF processing completed. Text chunks: {len(processed_content['text_chunks'])}, Tables: {len(table_content)}, Images: {len(image_content)}")
@@ -54,78 +436,77 @@ class MultimodalPDFProcessor:
             logger.error(f"Error processing PDF: {str(e)}")
             raise
     
-    async def _extract_text_content(self, pdf_path: str) -> List[Dict[str, Any]]:
+    async def _extract_text_content(
+        self,
+        doc,
+        executor: Optional[Executor] = None
+    ) -> List[Dict[str, Any]]:
         """Extract text content from PDF"""
-        text_content = []
-        
-        # Use PyMuPDF for text extraction
-        doc = fitz.open(pdf_path)
-        
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            
-            # Extract text
-            text = page.get_text()
-            
-            if text.strip():
-                text_content.append({
-                    "content": text,
-                    "page_number": page_num + 1,
-                    "content_type": "text",
-                    "bbox": None
-                })
-        
-        doc.close()
-        return text_content
+        return await self._map_page_blocks(_process_page_text, doc, executor)
     
-    async def _extract_tables(self, pdf_path: str) -> List[Dict[str, Any]]:
+    async def _extract_tables(
+        self,
+        doc,
+        pdf_bytes: bytes,
+        executor: Optional[Executor] = None
+    ) -> List[Dict[str, Any]]:
         """Extract tables from PDF using multiple methods"""
         tables = []
+        pages_with_tables = set()
         
         try:
-            # Method 1: Camelot for lattice and stream detection
-            camelot_tables = camelot.read_pdf(pdf_path, pages='all', flavor='lattice')
-            
-            for i, table in enumerate(camelot_tables):
-                if table.df is not None and not table.df.empty:
-                    # Fix duplicate columns
-                    df = self._fix_duplicate_columns(table.df)
-
-                    tables.append({
-                        "content": df.to_dict('records'),
-                        "raw_df": df,
-                        "page_number": table.page,
-                        "content_type": "table",
-                        "extraction_method": "camelot_lattice",
-                        "table_id": f"table_{i}",
-                        "confidence": table.accuracy if hasattr(table, 'accuracy') else None
-                    })
-            
-            # Method 2: Try stream flavor for tables without clear borders
-            stream_tables = camelot.read_pdf(pdf_path, pages='all', flavor='stream')
-            
-            for i, table in enumerate(stream_tables):
-                if table.df is not None and not table.df.empty:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                # Camelot re-reads the whole file for every page it handles,
+                # so split the pages out once and feed it single-page files
+                page_paths = self._split_pages(doc, tmp_dir)
+                
+                # Method 1: Camelot, running only the flavor that suits each
+                # page - lattice for ruled tables, stream for borderless ones
+                pages = [
+                    (page_num, page_path, self._detect_table_flavor(doc[page_num]))
+                    for page_num, page_path in enumerate(page_paths)
+                ]
+                blocks = [pages[i:i + PAGE_BLOCK_SIZE] for i in range(0, len(pages), PAGE_BLOCK_SIZE)]
+                
+                # Ruling detection is CPU-bound, so blocks of pages run in
+                # worker processes; results come back in page order
+                if executor is None:
+                    block_results = [_read_page_tables(block) for block in blocks]
+                else:
+                    loop = asyncio.get_running_loop()
+                    block_results = await asyncio.gather(*[
+                        loop.run_in_executor(executor, _read_page_tables, block)
+                        for block in blocks
+                    ])
+                
+                flavor_counts = {"lattice": 0, "stream": 0}
+                for page_num, flavor, raw_df, accuracy in (item for block_result in block_results for item in block_result):
                     # Fix duplicate columns
-                    df = self._fix_duplicate_columns(table.df)
+                    df = self._fix_duplicate_columns(raw_df)
+                    
+                    table_index = flavor_counts[flavor]
+                    flavor_counts[flavor] += 1
 
                     tables.append({
-                        "content": df.to_dict('records'),
                         "raw_df": df,
-                        "page_number": table.page,
+                        "page_number": page_num + 1,
                         "content_type": "table",
-                        "extraction_method": "camelot_stream",
-                        "table_id": f"stream_table_{i}",
-                        "confidence": table.accuracy if hasattr(table, 'accuracy') else None
+                        "extraction_method": f"camelot_{flavor}",
+                        "table_id": f"table_{table_index}" if flavor == "lattice" else f"stream_table_{table_index}",
+                        "confidence": accuracy
                     })
+                    pages_with_tables.add(page_num)
         
         except Exception as e:
             logger.warning(f"Camelot table extraction failed: {str(e)}")
         
-        # Method 3: pdfplumber as fallback
+        # Method 2: pdfplumber as fallback for pages where Camelot found nothing
         try:
-            with PDF.open(pdf_path) as pdf:
+            with PDF.open(BytesIO(pdf_bytes)) as pdf:
                 for page_num, page in enumerate(pdf.pages):
+                    if page_num in pages_with_tables:
+                        continue
+                    
                     page_tables = page.extract_tables()
                     
                     for i, table in enumerate(page_tables):
@@ -135,7 +516,6 @@ class MultimodalPDFProcessor:
                             df = self._fix_duplicate_columns(df)
 
                             tables.append({
-                                "content": df.to_dict('records'),
                                 "raw_df": df,
                                 "page_number": page_num + 1,
                                 "content_type": "table",
@@ -148,65 +528,125 @@ class MultimodalPDFProcessor:
         
         return tables
     
-    async def _extract_images(self, pdf_path: str) -> List[Dict[str, Any]]:
+    def _detect_table_flavor(self, page) -> str:
+        """Pick the Camelot flavor for a page from its vector drawings"""
+        # Ruled tables are drawn with many line and rectangle paths
+        if len(page.get_drawings()) > LATTICE_DRAWING_THRESHOLD:
+            return "lattice"
+        return "stream"
+    
+    async def _extract_images(
+        self,
+        doc,
+        executor: Optional[Executor] = None
+    ) -> List[Dict[str, Any]]:
         """Extract images from PDF with graceful OCR fallback"""
-        images = []
+        # Map each xref to its first reference so workers render it only once
+        first_refs = {}
+        for page_num in range(len(doc)):
+            for img_index, img in enumerate(doc[page_num].get_images()):
+                first_refs.setdefault(img[0], (page_num, img_index))
+        
+        images = await self._map_page_blocks(
+            _process_page_images, doc, executor, first_refs, settings.STORE_IMAGE_BLOBS
+        )
+        
+        rendered = {image["xref"]: image for image in images if "pixels" in image}
+        if not rendered:
+            return []
+        
+        # Try OCR if available, otherwise use placeholder
+        reader = _get_easyocr_reader() if settings.OCR_BACKEND.lower() == "easyocr" else None
+        if reader is not None:
+            ocr_texts = await asyncio.to_thread(
+                _ocr_images_easyocr, reader, [image["pixels"] for image in rendered.values()]
+            )
+        elif self._check_tesseract_available():
+            ocr_texts = await self._ocr_images(
+                [image["pixels"] for image in rendered.values()]
+            )
+        else:
+            ocr_texts = ["[OCR not available - Tesseract not installed]"] * len(rendered)
+        
+        # Raw pixels are only needed for OCR
+        for image, ocr_text in zip(rendered.values(), ocr_texts):
+            image["ocr_text"] = ocr_text
+            del image["pixels"]
+        
+        # Repeated references share the rendered content and OCR text; those
+        # whose first rendering failed are dropped along with it
+        resolved = []
+        for image in images:
+            source = rendered.get(image["xref"])
+            if source is None:
+                continue
+            if source is not image:
+                image.update({key: value for key, value in source.items() if key in ("content", "size", "ocr_text")})
+            resolved.append(image)
+        
+        if len(rendered) < len(resolved):
+            logger.info(f"Rendered {len(rendered)} unique images for {len(resolved)} image references")
+        
+        return resolved
+    
+    async def _ocr_images(self, images: List[np.ndarray]) -> List[str]:
+        """OCR images with parallel single-threaded Tesseract batches
 
-        # Check if tesseract is available
-        tesseract_available = self._check_tesseract_available()
+        Tesseract runs as a native subprocess, so a thread per batch gives
+        true parallelism without holding the GIL.
+        """
+        workers = min(len(images), os.cpu_count() or 1)
+        batch_size = -(-len(images) // workers)
+        batches = [images[i:i + batch_size] for i in range(0, len(images), batch_size)]
+        
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=len(batches)) as ocr_executor:
+            batch_results = await asyncio.gather(*[
+                loop.run_in_executor(ocr_executor, _ocr_image_batch, self._tesseract_path, batch)
+                for batch in batches
+            ], return_exceptions=True)
+        
+        ocr_texts = []
+        for batch, result in zip(batches, batch_results):
+            if isinstance(result, Exception):
+                logger.warning(f"Batch OCR failed for {len(batch)} images: {str(result)}")
+                result = ["[OCR not available]"] * len(batch)
+            ocr_texts.extend(result)
+        
+        return ocr_texts
+    
+    async def _map_page_blocks(
+        self,
+        func: Callable[..., List[Dict[str, Any]]],
+        doc,
+        executor: Optional[Executor],
+        *args
+    ) -> List[Dict[str, Any]]:
+        """Run a page-block function over the whole PDF, preserving page order
 
-        doc = fitz.open(pdf_path)
+        Without an executor the blocks are processed inline against ``doc``;
+        worker processes use the document opened by ``_init_worker``.
+        """
+        page_count = len(doc)
         
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            image_list = page.get_images()
-            
-            for img_index, img in enumerate(image_list):
-                try:
-                    # Extract image
-                    xref = img[0]
-                    pix = fitz.Pixmap(doc, xref)
-                    
-                    if pix.n - pix.alpha < 4:  # GRAY or RGB
-                        img_data = pix.tobytes("png")
-                        
-                        # Convert to base64 for storage
-                        img_base64 = base64.b64encode(img_data).decode()
-
-                        # Try OCR if available, otherwise use placeholder
-                        if tesseract_available:
-                            try:
-                                img_pil = Image.open(BytesIO(img_data))
-                                # Configure pytesseract to use the correct path
-                                if hasattr(self, 'tesseract_path') and self.tesseract_path != 'tesseract':
-                                    pytesseract.pytesseract.tesseract_cmd = self.tesseract_path
-                                ocr_text = pytesseract.image_to_string(img_pil)
-                            except Exception as e:
-                                logger.warning(f"OCR failed for image {img_index} on page {page_num}: {str(e)}")
-                                ocr_text = "[OCR not available]"
-                        else:
-                            ocr_text = "[OCR not available - Tesseract not installed]"
-                        
-                        images.append({
-                            "content": img_base64,
-                            "ocr_text": ocr_text,
-                            "page_number": page_num + 1,
-                            "content_type": "image",
-                            "image_id": f"img_{page_num}_{img_index}",
-                            "size": (pix.width, pix.height)
-                        })
-                    
-                    pix = None
-                
-                except Exception as e:
-                    logger.warning(f"Error extracting image {img_index} from page {page_num}: {str(e)}")
+        blocks = [
+            list(range(start, min(start + PAGE_BLOCK_SIZE, page_count)))
+            for start in range(0, page_count, PAGE_BLOCK_SIZE)
+        ]
         
-        doc.close()
-        return images
+        if executor is None:
+            block_results = [func(doc, block, *args) for block in blocks]
+        else:
+            loop = asyncio.get_running_loop()
+            block_results = await asyncio.gather(*[
+                loop.run_in_executor(executor, _run_in_worker, func, block, *args)
+                for block in blocks
+            ])
+        
+        return [item for block_result in block_results for item in block_result]
     
-    async def _extract_metadata(self, pdf_path: str) -> Dict[str, Any]:
+    async def _extract_metadata(self, doc, file_size: int) -> Dict[str, Any]:
         """Extract PDF metadata"""
-        doc = fitz.open(pdf_path)
         metadata = doc.metadata
         
         return {
@@ -218,61 +658,119 @@ class MultimodalPDFProcessor:
             "creation_date": metadata.get("creationDate", ""),
             "modification_date": metadata.get("modDate", ""),
             "page_count": len(doc),
-            "file_size": os.path.getsize(pdf_path)
+            "file_size": file_size
         }
     
+    def _split_pages(self, doc, output_dir: str) -> List[str]:
+        """Write each page of an open document to its own PDF file"""
+        page_paths = []
+        
+        for page_num in range(len(doc)):
+            page_doc = fitz.open()
+            page_doc.insert_pdf(doc, from_page=page_num, to_page=page_num)
+            page_path = os.path.join(output_dir, f"page_{page_num + 1}.pdf")
+            page_doc.save(page_path)
+            page_doc.close()
+            page_paths.append(page_path)
+        
+        return page_paths
+    
     def _chunk_text_content(self, text_content: List[Dict[str, Any]]) -> List[Document]:
-        """Chunk text content for vector storage"""
+        """Chunk text content for vector storage
+
+        Consecutive blocks from the same page are packed into chunks of up to
+        ``chunk_size`` characters as-is; only blocks longer than that go
+        through the recursive splitter.
+        """
         documents = []
+        chunk_counts = {}
+        pending = []
         
-        for content in text_content:
-            if content["content"].strip():
-                chunks = self.text_splitter.split_text(content["content"])
-                
-                for i, chunk in enumerate(chunks):
-                    doc = Document(
-                        page_content=chunk,
-                        metadata={
-                            "page_number": content["page_number"],
-                            "content_type": content["content_type"],
-                            "chunk_index": i,
-                            "source": "pdf_text"
-                        }
+        def add_chunk(text: str, content: Dict[str, Any], bbox: Optional[Tuple[float, ...]]):
+            page_number = content["page_number"]
+            chunk_index = chunk_counts.get(page_number, 0)
+            chunk_counts[page_number] = chunk_index + 1
+            
+            metadata = {
+                "page_number": page_number,
+                "content_type": content["content_type"],
+                "chunk_index": chunk_index,
+                "source": "pdf_text"
+            }
+            if bbox:
+                # Vector store metadata only accepts scalar values
+                metadata["bbox"] = ",".join(f"{coord:.1f}" for coord in bbox)
+            
+            documents.append(Document(page_content=text, metadata=metadata))
+        
+        def flush_pending():
+            if pending:
+                boxes = [item.get("bbox") for item in pending]
+                bbox = None
+                if all(boxes):
+                    bbox = (
+                        min(box[0] for box in boxes), min(box[1] for box in boxes),
+                        max(box[2] for box in boxes), max(box[3] for box in boxes)
                     )
-                    documents.append(doc)
+                add_chunk("\n".join(item["content"].strip() for item in pending), pending[0], bbox)
+                pending.clear()
+        
+        pending_length = 0
+        for content in text_content:
+            text = content["content"].strip()
+            if not text:
+                continue
+            
+            if pending and (
+                content["page_number"] != pending[0]["page_number"]
+                or pending_length + len(text) + 1 > self.chunk_size
+            ):
+                flush_pending()
+                pending_length = 0
+            
+            # Fast path: blocks that already fit skip the recursive splitter
+            if len(text) <= self.chunk_size:
+                pending.append(content)
+                pending_length += len(text) + 1
+                continue
+            
+            for chunk in self.text_splitter.split_text(text):
+                add_chunk(chunk, content, content.get("bbox"))
+        
+        flush_pending()
         
         return documents
 
     def _fix_duplicate_columns(self, df) -> pd.DataFrame:
         """Fix duplicate column names in DataFrame"""
-        # Get column names
-        cols = df.columns.tolist()
-
-        # Track seen column names and their counts
-        seen = {}
-        new_cols = []
+        # Most tables have unique headers; skip the rename entirely
+        if df.columns.is_unique:
+            return df
 
-        for col in cols:
-            if col in seen:
-                seen[col] += 1
-                new_cols.append(f"{col}_{seen[col]}")
-            else:
-                seen[col] = 0
-                new_cols.append(col)
-
-        # Create new DataFrame with fixed column names
-        df.columns = new_cols
+        # Number repeated names by occurrence: a, a_1, a_2, ...
+        counts = df.columns.to_series().groupby(df.columns, dropna=False).cumcount()
+        df.columns = [col if n == 0 else f"{col}_{n}" for col, n in zip(df.columns, counts)]
 
         return df
 
     def _check_tesseract_available(self) -> bool:
-        """Check if tesseract is available"""
+        """Check if tesseract is available, probing only once per process"""
+        if MultimodalPDFProcessor._tesseract_path is not _UNCHECKED:
+            return MultimodalPDFProcessor._tesseract_path is not None
+        
+        MultimodalPDFProcessor._tesseract_path = self._find_tesseract()
+        return MultimodalPDFProcessor._tesseract_path is not None
+    
+    def _find_tesseract(self) -> Optional[str]:
+        """Locate a working tesseract binary"""
         try:
-            import subprocess
+            # A PATH lookup needs no subprocess
+            path = shutil.which('tesseract')
+            if path:
+                return path
 
-            # Common Tesseract paths on different systems
+            # Common install locations that may be missing from PATH
             tesseract_paths = [
-                'tesseract',  # If in PATH
                 r'C:\Program Files\Tesseract-OCR\tesseract.exe',  # Windows default
                 '/usr/bin/tesseract',  # Linux
                 '/usr/local/bin/tesseract',  # macOS/Linux
@@ -284,12 +782,10 @@ class MultimodalPDFProcessor:
                     result = subprocess.run([tesseract_path, '--version'],
                                           capture_output=True, text=True, timeout=5)
                     if result.returncode == 0:
-                        # Store the working path for later use
-                        self.tesseract_path = tesseract_path
-                        return True
+                        return tesseract_path
                 except (subprocess.TimeoutExpired, FileNotFoundError, subprocess.SubprocessError):
                     continue
 
-            return False
+            return None
         except Exception:
-            return False
\ No newline at end of file
+            return None
\ No newline at end of file
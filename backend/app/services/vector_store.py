@@ -1,6 +1,13 @@
 from typing import List, Dict, Any, Optional
 import os
+import time
+import atexit
+import asyncio
+import hashlib
 import pickle
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
 from langchain_community.vectorstores import Chroma, FAISS
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
@@ -10,6 +17,55 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Output dimensions of known embedding models, used to size an empty FAISS index
+EMBEDDING_DIMENSIONS = {
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+    "text-embedding-ada-002": 1536
+}
+
+# Marker file next to the persisted store, rewritten whenever documents are
+# added. Caches key on its modification time, so no worker process serves
+# results computed before content indexed by any other worker
+CONTENT_VERSION_FILE = ".content_version"
+
+def _content_version_path() -> str:
+    if settings.VECTOR_DB_TYPE.lower() == "faiss":
+        directory = os.path.dirname(settings.FAISS_INDEX_PATH)
+    else:
+        directory = settings.CHROMA_PERSIST_DIRECTORY
+    return os.path.join(directory, CONTENT_VERSION_FILE)
+
+def get_content_version() -> int:
+    """Version of the indexed content, changed on every ingestion by any worker"""
+    try:
+        return os.stat(_content_version_path()).st_mtime_ns
+    except OSError:
+        return 0
+
+def _bump_content_version() -> None:
+    path = _content_version_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(str(time.time_ns()))
+
+# Query embeddings keyed by model and SHA-256 of the query text, so a repeated
+# question is embedded once and shared by retrieval and the answer cache.
+# Stored as float32 arrays: 12 KB for a 3072-d vector instead of ~100 KB as
+# a list of Python floats
+QUERY_EMBEDDING_CACHE_SIZE = 2048
+_query_embedding_cache = LRUCache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)
+
+def _normalize_page_number(metadata: Dict[str, Any]) -> None:
+    """Store page_number as an int so readers never parse it; drop unusable values"""
+    page_number = metadata.get("page_number")
+    if isinstance(page_number, int) or page_number is None:
+        return
+    if isinstance(page_number, str) and page_number.strip().isdigit():
+        metadata["page_number"] = int(page_number)
+    else:
+        del metadata["page_number"]
+
 class VectorStoreService:
     def __init__(self):
         try:
@@ -23,6 +79,8 @@ class VectorStoreService:
             raise
         self.vector_store = None
         self._initialize_vector_store()
+        # Writes are flushed per batch of content; persist whatever is left on exit
+        atexit.register(self._persist)
     
     def _initialize_vector_store(self):
         """Initialize the vector store based on configuration"""
@@ -40,23 +98,32 @@ class VectorStoreService:
                     self.embeddings
                 )
             else:
-                # Create empty FAISS index
-                self.vector_store = FAISS.from_texts(
-                    ["dummy"], self.embeddings
-                )
-                self.vector_store.delete([0])  # Remove dummy text
+                self.vector_store = self._create_empty_faiss()
+    
+    def _create_empty_faiss(self) -> FAISS:
+        """Create an empty FAISS index without embedding a placeholder text"""
+        import faiss
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+        
+        dimension = EMBEDDING_DIMENSIONS.get(settings.EURI_EMBEDDING_MODEL)
+        if dimension is None:
+            # Unknown model: measure its output size with a single embedding
+            dimension = len(self.embeddings.embed_query("dimension probe"))
+        
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=faiss.IndexFlatL2(dimension),
+            docstore=InMemoryDocstore({}),
+            index_to_docstore_id={}
+        )
     
     async def add_documents(self, documents: List[Document]) -> None:
         """Add documents to the vector store"""
         try:
             logger.info(f"Adding {len(documents)} documents to vector store")
             
-            if settings.VECTOR_DB_TYPE.lower() == "chroma":
-                self.vector_store.add_documents(documents)
-                self.vector_store.persist()
-            elif settings.VECTOR_DB_TYPE.lower() == "faiss":
-                self.vector_store.add_documents(documents)
-                self.vector_store.save_local(settings.FAISS_INDEX_PATH)
+            # Embedding requests and index writes block, so keep them off the event loop
+            await asyncio.to_thread(self._add_documents_blocking, documents)
             
             logger.info("Documents successfully added to vector store")
             
@@ -64,6 +131,33 @@ class VectorStoreService:
             logger.error(f"Error adding documents to vector store: {str(e)}")
             raise
     
+    def _add_documents_blocking(self, documents: List[Document]) -> None:
+        """Embed and insert documents synchronously; see ``flush`` for persistence"""
+        if settings.VECTOR_DB_TYPE.lower() == "chroma":
+            self.vector_store.add_documents(documents)
+        elif settings.VECTOR_DB_TYPE.lower() == "faiss":
+            # Embed every document in one batched call
+            texts = [doc.page_content for doc in documents]
+            vectors = self.embeddings.embed_documents(texts)
+            self.vector_store.add_embeddings(
+                list(zip(texts, vectors)),
+                metadatas=[doc.metadata for doc in documents]
+            )
+    
+    async def flush(self) -> None:
+        """Persist the vector store to disk"""
+        await asyncio.to_thread(self._persist)
+    
+    def _persist(self) -> None:
+        """Write the vector store to disk synchronously"""
+        try:
+            if settings.VECTOR_DB_TYPE.lower() == "chroma":
+                self.vector_store.persist()
+            elif settings.VECTOR_DB_TYPE.lower() == "faiss":
+                self.vector_store.save_local(settings.FAISS_INDEX_PATH)
+        except Exception as e:
+            logger.error(f"Error persisting vector store: {str(e)}")
+    
     async def similarity_search(
         self,
         query: str,
@@ -72,12 +166,15 @@ class VectorStoreService:
     ) -> List[Document]:
         """Perform similarity search with error handling"""
         try:
-            if filter_dict and settings.VECTOR_DB_TYPE.lower() == "chroma":
-                results = self.vector_store.similarity_search(
-                    query, k=k, filter=filter_dict
+            # The query embedding is an HTTP call; run it in a worker thread
+            if filter_dict:
+                results = await asyncio.to_thread(
+                    self.vector_store.similarity_search, query, k=k, filter=filter_dict
                 )
             else:
-                results = self.vector_store.similarity_search(query, k=k)
+                results = await asyncio.to_thread(
+                    self.vector_store.similarity_search, query, k=k
+                )
 
             return results
 
@@ -89,6 +186,42 @@ class VectorStoreService:
                 return []
             raise
     
+    async def embed_query(self, query: str) -> np.ndarray:
+        """Embed a query so it can be reused across several searches"""
+        key = (settings.EURI_EMBEDDING_MODEL, hashlib.sha256(query.encode("utf-8")).digest())
+        embedding = _query_embedding_cache.get(key)
+        if embedding is None:
+            embedding = await asyncio.to_thread(self.embeddings.embed_query, query)
+            embedding = np.asarray(embedding, dtype=np.float32)
+            _query_embedding_cache[key] = embedding
+        return embedding
+    
+    async def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 5,
+        filter_dict: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        """Perform similarity search with a precomputed query embedding"""
+        try:
+            if filter_dict:
+                results = await asyncio.to_thread(
+                    self.vector_store.similarity_search_by_vector, embedding, k=k, filter=filter_dict
+                )
+            else:
+                results = await asyncio.to_thread(
+                    self.vector_store.similarity_search_by_vector, embedding, k=k
+                )
+
+            return results
+
+        except Exception as e:
+            logger.error(f"Error performing similarity search by vector: {str(e)}")
+            if "400" in str(e) or "500" in str(e):
+                logger.warning("API error encountered, returning empty search results")
+                return []
+            raise
+    
     async def similarity_search_with_score(
         self, 
         query: str, 
@@ -96,38 +229,64 @@ class VectorStoreService:
     ) -> List[tuple]:
         """Perform similarity search with scores"""
         try:
-            results = self.vector_store.similarity_search_with_score(query, k=k)
+            results = await asyncio.to_thread(
+                self.vector_store.similarity_search_with_score, query, k=k
+            )
             return results
             
         except Exception as e:
             logger.error(f"Error performing similarity search with score: {str(e)}")
             raise
 
+# One store per process: every service shares the embeddings client and the
+# loaded index instead of each holding its own in-memory copy
+_vector_store_service: Optional[VectorStoreService] = None
+
+def get_vector_store_service() -> VectorStoreService:
+    """Get the shared vector store, loading it on first use"""
+    global _vector_store_service
+    if _vector_store_service is None:
+        _vector_store_service = VectorStoreService()
+    return _vector_store_service
+
 class MultimodalVectorStoreService:
-    def __init__(self):
-        self.text_store = VectorStoreService()
-        self.table_store = VectorStoreService()
-        self.image_store = VectorStoreService()
+    @property
+    def store(self) -> VectorStoreService:
+        """The shared store, resolved on use so instances are cheap to create
+
+        A single store holds every modality; searches filter on the
+        "content_type" metadata set during vectorization. Services built at
+        import time therefore do not load the index before the server binds.
+        """
+        return get_vector_store_service()
     
     async def add_multimodal_content(self, processed_content: Dict[str, Any]):
-        """Add multimodal content to appropriate vector stores"""
+        """Add multimodal content to the vector store in a single batch"""
+        documents = []
+        
         # Add text chunks
         if processed_content.get("text_chunks"):
-            await self.text_store.add_documents(processed_content["text_chunks"])
+            documents.extend(processed_content["text_chunks"])
         
         # Process and add tables
         if processed_content.get("tables"):
-            table_documents = self._process_tables_for_vectorization(
+            documents.extend(self._process_tables_for_vectorization(
                 processed_content["tables"]
-            )
-            await self.table_store.add_documents(table_documents)
+            ))
         
         # Process and add images
         if processed_content.get("images"):
-            image_documents = self._process_images_for_vectorization(
+            documents.extend(self._process_images_for_vectorization(
                 processed_content["images"]
-            )
-            await self.image_store.add_documents(image_documents)
+            ))
+        
+        if documents:
+            for doc in documents:
+                _normalize_page_number(doc.metadata)
+            await self.store.add_documents(documents)
+            # Persist once per document rather than after every insert
+            await self.store.flush()
+            await asyncio.to_thread(_bump_content_version)
     
     def _process_tables_for_vectorization(self, tables: List[Dict[str, Any]]) -> List[Document]:
         """Convert tables to documents for vectorization"""
@@ -135,7 +294,7 @@ class MultimodalVectorStoreService:
         
         for table in tables:
             # Convert table to text representation
-            table_text = self._table_to_text(table["content"])
+            table_text = self._table_to_text(table["raw_df"])
             
             doc = Document(
                 page_content=table_text,
@@ -170,38 +329,61 @@ class MultimodalVectorStoreService:
         
         return documents
     
-    def _table_to_text(self, table_data: List[Dict[str, Any]]) -> str:
-        """Convert table data to text representation"""
-        if not table_data:
+    def _table_to_text(self, df: pd.DataFrame) -> str:
+        """Convert a table DataFrame to text representation"""
+        if df is None or df.empty:
             return ""
         
         # Get column headers
-        headers = list(table_data[0].keys())
-        text_parts = [f"Table with columns: {', '.join(headers)}"]
+        headers = ", ".join(str(col) for col in df.columns)
         
-        # Add row data
-        for row in table_data[:10]:  # Limit to first 10 rows for vectorization
-            row_text = " | ".join([f"{k}: {v}" for k, v in row.items() if v])
-            text_parts.append(row_text)
+        # Rows are "col: val | col: val", the format the analytics and chart
+        # parsers read back; built a column at a time over the first 10 rows
+        head = df.head(10)
+        rows = pd.Series("", index=head.index)
+        for column, values in head.items():
+            # Empty and missing cells are left out, as when rows were dicts
+            present = values.notna() & values.ne("") & values.ne(0)
+            rows += (f" | {column}: " + values.astype(str)).where(present, "")
         
-        return "\n".join(text_parts)
+        return "\n".join([f"Table with columns: {headers}", *rows.str[3:]])
+    
+    async def embed_query(self, query: str) -> np.ndarray:
+        """Embed a query for use with search_multimodal"""
+        return await self.store.embed_query(query)
     
     async def search_multimodal(
         self, 
         query: str, 
         content_types: List[str] = ["text", "table", "image"],
-        k_per_type: int = 3
+        k_per_type: int = 3,
+        query_embedding: Optional[np.ndarray] = None
     ) -> Dict[str, List[Document]]:
-        """Search across all content types"""
-        results = {}
+        """Search across all content types
+        
+        The query is embedded once (or ``query_embedding`` is used when the
+        caller already has it) and the per-type searches run concurrently.
+        """
+        search_types = [
+            content_type for content_type in ["text", "table", "image"]
+            if content_type in content_types
+        ]
+        if not search_types:
+            return {}
         
-        if "text" in content_types:
-            results["text"] = await self.text_store.similarity_search(query, k=k_per_type)
+        if query_embedding is None:
+            # Searching by text would embed the query again for every type
+            query_embedding = await self.embed_query(query)
         
-        if "table" in content_types:
-            results["table"] = await self.table_store.similarity_search(query, k=k_per_type)
+        # The LangChain stores take a list of floats; convert once for all types
+        embedding = np.asarray(query_embedding, dtype=np.float32).tolist()
+        searches = [
+            self.store.similarity_search_by_vector(
+                embedding, k=k_per_type, filter_dict={"content_type": content_type}
+            )
+            for content_type in search_types
+        ]
         
-        if "image" in content_types:
-            results["image"] = await self.image_store.similarity_search(query, k=k_per_type)
+        search_results = await asyncio.gather(*searches)
         
-        return results
\ No newline at end of file
+        return dict(zip(search_types, search_results))
\ No newline at end of file
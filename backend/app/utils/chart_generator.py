@@ -1,14 +1,55 @@
 import pandas as pd
+import pyarrow as pa
+import numpy as np
+import orjson
 import plotly.graph_objects as go
-import plotly.express as px
 from typing import List, Dict, Any, Optional
 import json
 import re
+import hashlib
+from collections import OrderedDict
 from langchain.schema import Document
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Formatting characters stripped from cells before numeric parsing
+_NUMERIC_STRIP = re.compile(r"[,$%\s]")
+
+# "key: value" cells of a pipe-separated row, with surrounding whitespace trimmed
+_KV_RE = re.compile(r"\s*([^|:]*?)\s*:\s*([^|]*?)\s*(?:\||$)")
+
+# Query keywords for each chart type, matched in a single scan
+_CHART_KEYWORD_PATTERN = re.compile(
+    r"(?P<line>trend|over time|timeline|progression)"
+    r"|(?P<histogram>distribution|frequency)"
+    r"|(?P<scatter>relationship|correlation)"
+    r"|(?P<pie>percentage|proportion|share)"
+)
+
+# Chart types in the order they win when several keyword groups match
+_CHART_TYPE_PRIORITY = ("line", "histogram", "scatter", "pie")
+_CHART_TYPE_RANK = {chart_type: rank for rank, chart_type in enumerate(_CHART_TYPE_PRIORITY)}
+
+# Figure specs kept for repeated chart requests, least recently used first;
+# cached specs are shared between responses and must not be mutated
+CHART_SPEC_CACHE_SIZE = 256
+_chart_spec_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+
+# orjson encodes numeric arrays natively; these flags cover the rest of a figure dict
+_PLOTLY_JSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def _plotly_json_default(obj: Any) -> Any:
+    """Encode values orjson cannot, such as object-dtype arrays of labels"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+# Words left out of generated chart titles
+_TITLE_STOPWORDS = frozenset({'what', 'show', 'tell', 'about', 'the', 'are', 'how', 'can', 'you'})
+
 class ChartGenerator:
     def __init__(self):
         self.chart_types = {
@@ -27,30 +68,53 @@ class ChartGenerator:
         """Generate chart based on query and table data"""
         try:
             # Extract table data from documents
-            table_data = self._extract_table_data(table_docs)
+            df = self._extract_table_data(table_docs)
+            return await self._generate_chart(query, df)
             
-            if not table_data:
-                return {}
-            
-            # Determine chart type and configuration
-            chart_config = self._analyze_query_for_chart_type(query, table_data)
-            
-            # Generate chart
-            chart = await self._create_chart(table_data, chart_config)
-            
-            return {
-                "chart": chart,
-                "config": chart_config,
-                "data_summary": self._get_data_summary(table_data)
-            }
+        except Exception as e:
+            logger.error(f"Error generating chart: {str(e)}")
+            return {}
+    
+    async def generate_chart_from_records(
+        self,
+        query: str,
+        records: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Generate chart based on query from already extracted table records"""
+        try:
+            return await self._generate_chart(query, self._records_to_frame(records))
             
         except Exception as e:
             logger.error(f"Error generating chart: {str(e)}")
             return {}
     
-    def _extract_table_data(self, table_docs: List[Document]) -> List[Dict[str, Any]]:
-        """Extract structured table data from documents"""
-        all_data = []
+    async def _generate_chart(self, query: str, df: pd.DataFrame) -> Dict[str, Any]:
+        """Build the chart, its config and a data summary for a table"""
+        if df.empty:
+            return {}
+        
+        # Every chart but a histogram needs two columns to plot
+        if len(df.columns) < 2 and self._detect_chart_type(query) != "histogram":
+            return {}
+        
+        # Column typing is shared by the chart config and the summary
+        numeric_columns = self._identify_numeric_columns(df)
+        
+        # Determine chart type and configuration
+        chart_config = self._analyze_query_for_chart_type(query, df, numeric_columns)
+        
+        # Generate chart
+        chart = await self._create_chart(df, chart_config)
+        
+        return {
+            "chart": chart,
+            "config": chart_config,
+            "data_summary": self._get_data_summary(df, numeric_columns)
+        }
+    
+    def _extract_table_data(self, table_docs: List[Document]) -> pd.DataFrame:
+        """Extract structured table data from documents into one DataFrame"""
+        records: List[Dict[str, Any]] = []
         
         for doc in table_docs:
             try:
@@ -61,66 +125,75 @@ class ChartGenerator:
                     # Parse content if it's structured
                     data = self._parse_table_content(doc.page_content)
                 
-                if data:
-                    all_data.extend(data)
+                records.extend(data or [])
                     
             except Exception as e:
                 logger.warning(f"Error extracting table data: {str(e)}")
         
-        return all_data
+        return self._records_to_frame(records)
+    
+    def _records_to_frame(self, records: List[Dict[str, Any]]) -> pd.DataFrame:
+        """Build one DataFrame from table records that may differ in columns"""
+        # Accumulate column-wise so the frame is built without per-row inference
+        columns: Dict[str, List[Any]] = {}
+        row_count = 0
+        
+        for row in records:
+            if not isinstance(row, dict):
+                continue
+            
+            for key, value in row.items():
+                column = columns.get(key)
+                if column is None:
+                    # Backfill rows seen before this column appeared
+                    column = columns[key] = [None] * row_count
+                column.append(value)
+            row_count += 1
+            
+            # Pad columns this row did not have
+            for column in columns.values():
+                if len(column) < row_count:
+                    column.append(None)
+        
+        return self._columns_to_frame(columns)
+    
+    def _columns_to_frame(self, columns: Dict[str, List[Any]]) -> pd.DataFrame:
+        """Build a DataFrame from column lists via Arrow"""
+        if not columns:
+            return pd.DataFrame()
+        
+        try:
+            return pa.table(columns).to_pandas(split_blocks=True, self_destruct=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Columns mixing value types cannot be typed by Arrow
+            return pd.DataFrame(columns)
     
     def _parse_table_content(self, content: str) -> List[Dict[str, Any]]:
         """Parse table content from text"""
-        lines = content.split('\n')
-        data = []
-        
-        # Look for structured data patterns
-        for line in lines:
-            if '|' in line:
-                # Parse pipe-separated values
-                parts = [part.strip() for part in line.split('|')]
-                if len(parts) >= 2:
-                    try:
-                        # Try to create a record
-                        if ':' in parts[0]:
-                            key_value_pairs = {}
-                            for part in parts:
-                                if ':' in part:
-                                    key, value = part.split(':', 1)
-                                    key_value_pairs[key.strip()] = value.strip()
-                            if key_value_pairs:
-                                data.append(key_value_pairs)
-                    except:
-                        continue
-        
-        return data
+        # Rows are pipe-separated and must start with a key-value cell
+        records = (
+            dict(_KV_RE.findall(line))
+            for line in content.split('\n')
+            if '|' in line and ':' in line.partition('|')[0]
+        )
+        
+        return [record for record in records if record]
     
     def _analyze_query_for_chart_type(
         self, 
         query: str, 
-        data: List[Dict[str, Any]]
+        df: pd.DataFrame,
+        numeric_columns: List[str]
     ) -> Dict[str, Any]:
         """Analyze query to determine appropriate chart type"""
-        query_lower = query.lower()
         
         # Get data columns
-        if not data:
+        if df.empty:
             return {"chart_type": "bar", "title": "Data Visualization"}
         
-        columns = list(data[0].keys())
-        numeric_columns = self._identify_numeric_columns(data)
-        
-        # Determine chart type based on query keywords
-        if any(keyword in query_lower for keyword in ["trend", "over time", "timeline", "progression"]):
-            chart_type = "line"
-        elif any(keyword in query_lower for keyword in ["distribution", "frequency"]):
-            chart_type = "histogram"
-        elif any(keyword in query_lower for keyword in ["relationship", "correlation"]):
-            chart_type = "scatter"
-        elif any(keyword in query_lower for keyword in ["percentage", "proportion", "share"]):
-            chart_type = "pie"
-        else:
-            chart_type = "bar"
+        columns = df.columns.tolist()
+        
+        chart_type = self._detect_chart_type(query)
         
         # Determine axes
         x_axis = columns[0] if columns else None
@@ -130,43 +203,44 @@ class ChartGenerator:
             "chart_type": chart_type,
             "x_axis": x_axis,
             "y_axis": y_axis,
+            "numeric_columns": numeric_columns,
             "title": self._generate_chart_title(query, chart_type),
             "description": f"Chart showing {query}"
         }
     
-    def _identify_numeric_columns(self, data: List[Dict[str, Any]]) -> List[str]:
+    def _detect_chart_type(self, query: str) -> str:
+        """Determine chart type based on query keywords"""
+        best_rank = len(_CHART_TYPE_PRIORITY)
+        
+        for match in _CHART_KEYWORD_PATTERN.finditer(query.lower()):
+            best_rank = min(best_rank, _CHART_TYPE_RANK[match.lastgroup])
+            # Nothing can outrank the top chart type, so stop scanning
+            if best_rank == 0:
+                break
+        
+        return _CHART_TYPE_PRIORITY[best_rank] if best_rank < len(_CHART_TYPE_PRIORITY) else "bar"
+    
+    def _identify_numeric_columns(self, df: pd.DataFrame) -> List[str]:
         """Identify numeric columns in the data"""
-        if not data:
+        if df.empty:
             return []
         
-        numeric_columns = []
+        # Check the first 10 rows, ignoring missing cells
+        sample = df.head(10)
+        present = sample.notna()
         
-        for column in data[0].keys():
-            # Check if values in this column are numeric
-            numeric_count = 0
-            total_count = 0
-            
-            for row in data[:10]:  # Check first 10 rows
-                value = row.get(column)
-                if value is not None:
-                    total_count += 1
-                    try:
-                        float(str(value).replace(',', '').replace('$', '').replace('%', ''))
-                        numeric_count += 1
-                    except:
-                        pass
-            
-            if total_count > 0 and numeric_count / total_count > 0.7:  # 70% numeric
-                numeric_columns.append(column)
+        cleaned = sample.astype(str).replace(_NUMERIC_STRIP, '', regex=True)
+        parsed = cleaned.apply(pd.to_numeric, errors='coerce')
         
-        return numeric_columns
+        numeric_ratio = (parsed.notna() & present).sum() / present.sum()
+        
+        return numeric_ratio[numeric_ratio > 0.7].index.tolist()  # 70% numeric
     
     def _generate_chart_title(self, query: str, chart_type: str) -> str:
         """Generate appropriate chart title"""
         # Extract key terms from query
         words = query.split()
-        key_words = [word for word in words if len(word) > 3 and word.lower() not in 
-                    ['what', 'show', 'tell', 'about', 'the', 'are', 'how', 'can', 'you']]
+        key_words = [word for word in words if len(word) > 3 and word.lower() not in _TITLE_STOPWORDS]
         
         if key_words:
             title = f"{chart_type.title()} Chart: {' '.join(key_words[:4])}"
@@ -177,25 +251,40 @@ class ChartGenerator:
     
     async def _create_chart(
         self, 
-        data: List[Dict[str, Any]], 
+        df: pd.DataFrame, 
         config: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Create chart based on configuration"""
-        if not data:
+        if df.empty:
             return {}
         
         try:
-            df = pd.DataFrame(data)
             chart_type = config.get("chart_type", "bar")
             
-            if chart_type in self.chart_types:
-                fig = self.chart_types[chart_type](df, config)
+            # Identical data and config produce identical specs, so serve
+            # repeats from the cache without building a figure
+            cache_key = self._chart_cache_key(df, config)
+            plotly_spec = _chart_spec_cache.get(cache_key) if cache_key else None
+            
+            if plotly_spec is not None:
+                _chart_spec_cache.move_to_end(cache_key)
             else:
-                fig = self._create_bar_chart(df, config)
+                if chart_type in self.chart_types:
+                    fig = self.chart_types[chart_type](df, config)
+                else:
+                    fig = self._create_bar_chart(df, config)
+                
+                # Plain JSON types for the frontend; the response encoder
+                # serializes the spec once along with the rest of the payload
+                plotly_spec = self._figure_to_spec(fig)
+                
+                if cache_key:
+                    _chart_spec_cache[cache_key] = plotly_spec
+                    if len(_chart_spec_cache) > CHART_SPEC_CACHE_SIZE:
+                        _chart_spec_cache.popitem(last=False)
             
-            # Convert to JSON for frontend
             return {
-                "plotly_json": fig.to_json(),
+                "plotly_spec": plotly_spec,
                 "config": config
             }
             
@@ -203,18 +292,54 @@ class ChartGenerator:
             logger.error(f"Error creating chart: {str(e)}")
             return {}
     
+    def _figure_to_spec(self, fig: go.Figure) -> Dict[str, Any]:
+        """Convert a figure to a spec of plain JSON types
+
+        NumPy arrays in the figure are lowered with orjson, falling back to
+        Plotly's encoder for anything orjson cannot handle.
+        """
+        try:
+            return orjson.loads(orjson.dumps(
+                fig.to_plotly_json(),
+                option=_PLOTLY_JSON_OPTIONS,
+                default=_plotly_json_default
+            ))
+        except TypeError as e:
+            logger.warning(f"orjson could not serialize chart, using Plotly encoder: {str(e)}")
+            return json.loads(fig.to_json())
+    
+    def _chart_cache_key(self, df: pd.DataFrame, config: Dict[str, Any]) -> Optional[tuple]:
+        """Build a cache key from the chart config and a digest of the data"""
+        try:
+            data_digest = hashlib.blake2b(
+                pd.util.hash_pandas_object(df, index=False).values.tobytes(),
+                digest_size=16
+            ).digest()
+        except TypeError:
+            # Unhashable cell values; skip caching for this chart
+            return None
+        
+        return (
+            config.get("chart_type", "bar"),
+            config.get("title"),
+            config.get("x_axis"),
+            config.get("y_axis"),
+            tuple(str(col) for col in df.columns),
+            data_digest
+        )
+    
     def _create_line_chart(self, df: pd.DataFrame, config: Dict[str, Any]) -> go.Figure:
         """Create line chart"""
         x_col = config.get("x_axis")
         y_col = config.get("y_axis")
         
         if x_col and y_col and x_col in df.columns and y_col in df.columns:
-            fig = px.line(df, x=x_col, y=y_col, title=config.get("title", "Line Chart"))
+            fig = self._xy_figure(go.Scatter, df, x_col, y_col, config.get("title", "Line Chart"), mode='lines')
         else:
             # Fallback: use first two columns
             cols = df.columns.tolist()
             if len(cols) >= 2:
-                fig = px.line(df, x=cols[0], y=cols[1], title=config.get("title", "Line Chart"))
+                fig = self._xy_figure(go.Scatter, df, cols[0], cols[1], config.get("title", "Line Chart"), mode='lines')
             else:
                 fig = go.Figure()
         
@@ -226,12 +351,12 @@ class ChartGenerator:
         y_col = config.get("y_axis")
         
         if x_col and y_col and x_col in df.columns and y_col in df.columns:
-            fig = px.bar(df, x=x_col, y=y_col, title=config.get("title", "Bar Chart"))
+            fig = self._xy_figure(go.Bar, df, x_col, y_col, config.get("title", "Bar Chart"))
         else:
             # Fallback: use first two columns
             cols = df.columns.tolist()
             if len(cols) >= 2:
-                fig = px.bar(df, x=cols[0], y=cols[1], title=config.get("title", "Bar Chart"))
+                fig = self._xy_figure(go.Bar, df, cols[0], cols[1], config.get("title", "Bar Chart"))
             else:
                 fig = go.Figure()
         
@@ -243,12 +368,12 @@ class ChartGenerator:
         y_col = config.get("y_axis")
         
         if x_col and y_col and x_col in df.columns and y_col in df.columns:
-            fig = px.pie(df, names=x_col, values=y_col, title=config.get("title", "Pie Chart"))
+            fig = self._pie_figure(df, x_col, y_col, config.get("title", "Pie Chart"))
         else:
             # Fallback: use first two columns
             cols = df.columns.tolist()
             if len(cols) >= 2:
-                fig = px.pie(df, names=cols[0], values=cols[1], title=config.get("title", "Pie Chart"))
+                fig = self._pie_figure(df, cols[0], cols[1], config.get("title", "Pie Chart"))
             else:
                 fig = go.Figure()
         
@@ -260,12 +385,12 @@ class ChartGenerator:
         y_col = config.get("y_axis")
         
         if x_col and y_col and x_col in df.columns and y_col in df.columns:
-            fig = px.scatter(df, x=x_col, y=y_col, title=config.get("title", "Scatter Plot"))
+            fig = self._xy_figure(go.Scatter, df, x_col, y_col, config.get("title", "Scatter Plot"), mode='markers')
         else:
             # Fallback: use first two columns
             cols = df.columns.tolist()
             if len(cols) >= 2:
-                fig = px.scatter(df, x=cols[0], y=cols[1], title=config.get("title", "Scatter Plot"))
+                fig = self._xy_figure(go.Scatter, df, cols[0], cols[1], config.get("title", "Scatter Plot"), mode='markers')
             else:
                 fig = go.Figure()
         
@@ -276,27 +401,46 @@ class ChartGenerator:
         y_col = config.get("y_axis") or config.get("x_axis")
         
         if y_col and y_col in df.columns:
-            fig = px.histogram(df, x=y_col, title=config.get("title", "Histogram"))
+            fig = self._histogram_figure(df, y_col, config.get("title", "Histogram"))
         else:
-            # Fallback: use first numeric column
-            numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+            # Fallback: use first numeric column detected for the config
+            numeric_cols = config.get("numeric_columns", [])
             if numeric_cols:
-                fig = px.histogram(df, x=numeric_cols[0], title=config.get("title", "Histogram"))
+                fig = self._histogram_figure(df, numeric_cols[0], config.get("title", "Histogram"))
             else:
                 fig = go.Figure()
         
         return fig
     
-    def _get_data_summary(self, data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _xy_figure(self, trace_type, df: pd.DataFrame, x_col, y_col, title: str, **trace_kwargs) -> go.Figure:
+        """Build a single-trace x/y figure straight from the DataFrame columns"""
+        return go.Figure(
+            trace_type(x=df[x_col].to_numpy(), y=df[y_col].to_numpy(), **trace_kwargs),
+            layout=go.Layout(title=title, xaxis_title=str(x_col), yaxis_title=str(y_col))
+        )
+    
+    def _pie_figure(self, df: pd.DataFrame, names_col, values_col, title: str) -> go.Figure:
+        """Build a pie figure straight from the DataFrame columns"""
+        return go.Figure(
+            go.Pie(labels=df[names_col].to_numpy(), values=df[values_col].to_numpy()),
+            layout=go.Layout(title=title)
+        )
+    
+    def _histogram_figure(self, df: pd.DataFrame, x_col, title: str) -> go.Figure:
+        """Build a histogram figure straight from a DataFrame column"""
+        return go.Figure(
+            go.Histogram(x=df[x_col].to_numpy()),
+            layout=go.Layout(title=title, xaxis_title=str(x_col), yaxis_title="count")
+        )
+    
+    def _get_data_summary(self, df: pd.DataFrame, numeric_columns: List[str]) -> Dict[str, Any]:
         """Get summary statistics of the data"""
-        if not data:
+        if df.empty:
             return {}
         
-        df = pd.DataFrame(data)
-        
         return {
             "row_count": len(df),
             "column_count": len(df.columns),
             "columns": df.columns.tolist(),
-            "numeric_columns": df.select_dtypes(include=['number']).columns.tolist()
+            "numeric_columns": numeric_columns
         }
\ No newline at end of file
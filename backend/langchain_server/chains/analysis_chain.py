@@ -1,16 +1,25 @@
-rom langchain.chains.base import Chain
+from langchain.chains.base import Chain
 from langchain.schema import Document
-from langchain.callbacks.manager import CallbackManagerForChainRun
+from langchain.callbacks.manager import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
 from typing import Dict, List, Any, Optional
 import logging
 import asyncio
+import re
+import itertools
 
 from app.services.vector_store import MultimodalVectorStoreService
 from app.services.llm_service import AdvancedLLMService
 from app.utils.chart_generator import ChartGenerator
+from app.core.event_loop import run_sync
 
 logger = logging.getLogger(__name__)
 
+# Numbered or bulleted points, or lines mentioning a change in the data
+_INSIGHT_RE = re.compile(
+    r"^(?:[1-5]\.|[•-])|increase|decrease|significant|trend|growth|decline",
+    re.IGNORECASE
+)
+
 class AnalysisChain(Chain):
     """Chain for comprehensive document analysis"""
     
@@ -38,56 +47,70 @@ class AnalysisChain(Chain):
         run_manager: Optional[CallbackManagerForChainRun] = None,
     ) -> Dict[str, Any]:
         """Execute the analysis chain"""
+        return run_sync(self._acall(inputs))
+    
+    async def _acall(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        """Execute the analysis chain on the running event loop"""
         
         query = inputs["query"]
         analysis_type = inputs.get("analysis_type", "general")
         include_visualization = inputs.get("include_visualization", True)
         
         if run_manager:
-            run_manager.on_text(f"Starting analysis for: {query}", verbose=True)
+            await run_manager.on_text(f"Starting analysis for: {query}", verbose=True)
         
         # Search for relevant content
-        search_results = asyncio.run(
-            self.vector_service.search_multimodal(
-                query=query,
-                content_types=["text", "table", "image"],
-                k_per_type=8
-            )
+        search_results = await self.vector_service.search_multimodal(
+            query=query,
+            content_types=["text", "table", "image"],
+            k_per_type=8
         )
         
         if run_manager:
-            run_manager.on_text(f"Found {sum(len(docs) for docs in search_results.values())} relevant documents", verbose=True)
+            await run_manager.on_text(f"Found {sum(len(docs) for docs in search_results.values())} relevant documents", verbose=True)
         
-        # Perform analysis based on type
+        # Perform analysis based on type; the document context is built once
+        # here and handed to the analysis that needs it
         if analysis_type == "trend":
-            analysis_result = asyncio.run(
-                self._perform_trend_analysis(query, search_results, run_manager)
-            )
-        elif analysis_type == "comparison":
-            analysis_result = asyncio.run(
-                self._perform_comparison_analysis(query, search_results, run_manager)
-            )
+            analysis_task = self._perform_trend_analysis(query, search_results)
         elif analysis_type == "summary":
-            analysis_result = asyncio.run(
-                self._perform_summary_analysis(query, search_results, run_manager)
+            summary_docs = search_results.get("text", []) + search_results.get("table", [])
+            analysis_task = self._perform_summary_analysis(
+                query, summary_docs, self._build_context(summary_docs)
             )
         else:
-            analysis_result = asyncio.run(
-                self._perform_general_analysis(query, search_results, run_manager)
+            all_docs = (
+                search_results.get("text", []) + 
+                search_results.get("table", []) + 
+                search_results.get("image", [])
             )
+            context = self._build_context(all_docs)
+            
+            if analysis_type == "comparison":
+                analysis_task = self._perform_comparison_analysis(
+                    query, search_results, all_docs, context
+                )
+            else:
+                analysis_task = self._perform_general_analysis(query, all_docs, context)
         
-        # Generate visualization if requested
-        chart_data = {}
+        # Generate visualization if requested, alongside the analysis
         if include_visualization and search_results.get("table"):
             if run_manager:
-                run_manager.on_text("Generating visualization...", verbose=True)
+                await run_manager.on_text("Generating visualization...", verbose=True)
             
-            chart_result = asyncio.run(
+            analysis_result, chart_data = await asyncio.gather(
+                analysis_task,
                 self.chart_generator.generate_chart_from_query(
                     query, search_results["table"]
                 )
             )
-            chart_data = chart_result
+        else:
+            analysis_result = await analysis_task
+            chart_data = {}
         
         # Extract insights
         insights = self._extract_insights(analysis_result["analysis"])
@@ -104,8 +127,7 @@ class AnalysisChain(Chain):
     async def _perform_trend_analysis(
         self, 
         query: str, 
-        search_results: Dict[str, List[Document]],
-        run_manager: Optional[CallbackManagerForChainRun] = None
+        search_results: Dict[str, List[Document]]
     ) -> Dict[str, Any]:
         """Perform trend analysis"""
         
@@ -118,17 +140,17 @@ class AnalysisChain(Chain):
                 "confidence": 0.2
             }
         
-        # Extract time series data
-        time_series_data = []
-        for doc in table_docs:
-            if "table_data" in doc.metadata:
-                time_series_data.extend(doc.metadata["table_data"])
+        # Only the record count and the first few records reach the prompt,
+        # so sample lazily instead of concatenating every table
+        table_records = [doc.metadata.get("table_data", []) for doc in table_docs]
+        record_count = sum(len(records) for records in table_records)
+        sample_records = list(itertools.islice(itertools.chain.from_iterable(table_records), 5))
         
         trend_prompt = f"""
         Perform a comprehensive trend analysis for: {query}
         
-        Available data: {len(time_series_data)} records
-        Sample data: {time_series_data[:5] if time_series_data else "No data"}
+        Available data: {record_count} records
+        Sample data: {sample_records if sample_records else "No data"}
         
         Analyze:
         1. Overall trends (increasing, decreasing, cyclical)
@@ -144,28 +166,23 @@ class AnalysisChain(Chain):
         analysis = await self.llm_service.generate_response(trend_prompt)
         
         # Calculate confidence based on data availability
-        confidence = min(0.9, 0.5 + (len(time_series_data) / 100))
+        confidence = min(0.9, 0.5 + (record_count / 100))
         
         return {
             "analysis": analysis,
             "confidence": confidence,
-            "data_points": len(time_series_data)
+            "data_points": record_count
         }
     
     async def _perform_comparison_analysis(
         self, 
         query: str, 
         search_results: Dict[str, List[Document]],
-        run_manager: Optional[CallbackManagerForChainRun] = None
+        all_docs: List[Document],
+        context: str
     ) -> Dict[str, Any]:
         """Perform comparison analysis"""
         
-        all_docs = (
-            search_results.get("text", []) + 
-            search_results.get("table", []) + 
-            search_results.get("image", [])
-        )
-        
         comparison_prompt = f"""
         Perform a detailed comparison analysis for: {query}
         
@@ -183,8 +200,6 @@ class AnalysisChain(Chain):
         Be quantitative and specific.
         """
         
-        # Build context from documents
-        context = self._build_context(all_docs)
         analysis = await self.llm_service.generate_response(
             comparison_prompt, 
             context=context
@@ -199,16 +214,11 @@ class AnalysisChain(Chain):
     async def _perform_summary_analysis(
         self, 
         query: str, 
-        search_results: Dict[str, List[Document]],
-        run_manager: Optional[CallbackManagerForChainRun] = None
+        all_docs: List[Document],
+        context: str
     ) -> Dict[str, Any]:
         """Perform summary analysis"""
         
-        all_docs = (
-            search_results.get("text", []) + 
-            search_results.get("table", [])
-        )
-        
         summary_prompt = f"""
         Create a comprehensive summary for: {query}
         
@@ -224,7 +234,6 @@ class AnalysisChain(Chain):
         Structure the summary logically with clear sections.
         """
         
-        context = self._build_context(all_docs)
         analysis = await self.llm_service.generate_response(
             summary_prompt, 
             context=context
@@ -239,17 +248,11 @@ class AnalysisChain(Chain):
     async def _perform_general_analysis(
         self, 
         query: str, 
-        search_results: Dict[str, List[Document]],
-        run_manager: Optional[CallbackManagerForChainRun] = None
+        all_docs: List[Document],
+        context: str
     ) -> Dict[str, Any]:
         """Perform general analysis"""
         
-        all_docs = (
-            search_results.get("text", []) + 
-            search_results.get("table", []) + 
-            search_results.get("image", [])
-        )
-        
         general_prompt = f"""
         Analyze the following content to answer: {query}
         
@@ -265,7 +268,6 @@ class AnalysisChain(Chain):
         Be thorough and cite specific information.
         """
         
-        context = self._build_context(all_docs)
         analysis = await self.llm_service.generate_response(
             general_prompt, 
             context=context
@@ -296,12 +298,9 @@ class AnalysisChain(Chain):
         insights = []
         
         # Look for numbered points or bullet points
-        lines = analysis.split('\n')
-        for line in lines:
+        for line in analysis.splitlines():
             line = line.strip()
-            if (line.startswith(('1.', '2.', '3.', '4.', '5.', '•', '-')) or
-                any(keyword in line.lower() for keyword in 
-                    ['increase', 'decrease', 'significant', 'trend', 'growth', 'decline'])):
+            if _INSIGHT_RE.search(line):
                 
                 # Clean up the line
                 clean_line = line.lstrip('1234567890.- •').strip()
@@ -322,4 +321,4 @@ class AnalysisChain(Chain):
                 page_num = doc.metadata.get("page_number", "Unknown")
                 sources.append(f"Page {page_num} ({content_type})")
         
-        return list(set(sources))  # Remove duplicates
+        return list(dict.fromkeys(sources))  # Remove duplicates, keeping order
@@ -0,0 +1,89 @@
+from typing import Any, Dict, Hashable, List, Optional
+from collections import OrderedDict
+import threading
+import time
+import logging
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class SemanticAnswerCache:
+    """In-memory cache of chain results keyed by question embedding
+
+    Each cache key (e.g. question type and content types) has its own inner
+    product index over L2-normalized embeddings, so a top-1 search gives the
+    cosine similarity of the closest cached question with the same key.
+    Access is locked, since callers run on more than one event loop thread.
+    """
+
+    def __init__(self, max_size: int, ttl: float, threshold: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self._indexes: Dict[Hashable, faiss.IndexIDMap] = {}
+        # Entry id -> (key, result, inserted_at), least recently used first
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        # Copied: normalize_L2 works in place and callers may pass a cached array
+        vector = np.array(embedding, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def get(self, key: Hashable, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """Return the cached result for a near-duplicate question, if any"""
+        vector = self._normalize(embedding)
+
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None or index.ntotal == 0 or vector.shape[1] != index.d:
+                return None
+
+            scores, ids = index.search(vector, 1)
+            entry_id, score = int(ids[0][0]), float(scores[0][0])
+            if entry_id < 0 or score < self.threshold:
+                return None
+
+            _, result, inserted_at = self._entries[entry_id]
+            if time.monotonic() - inserted_at > self.ttl:
+                self._remove(entry_id)
+                return None
+
+            self._entries.move_to_end(entry_id)
+
+        logger.debug("Semantic answer cache hit (similarity %.3f)", score)
+        return result
+
+    def put(self, key: Hashable, embedding: List[float], result: Dict[str, Any]) -> None:
+        """Cache a result, evicting the least recently used entry when full"""
+        vector = self._normalize(embedding)
+
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index = faiss.IndexIDMap(faiss.IndexFlatIP(vector.shape[1]))
+                self._indexes[key] = index
+            elif vector.shape[1] != index.d:
+                return
+
+            entry_id = self._next_id
+            self._next_id += 1
+            index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = (key, result, time.monotonic())
+
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id: int) -> None:
+        # Callers hold the lock
+        key, _, _ = self._entries.pop(entry_id)
+        index = self._indexes[key]
+        index.remove_ids(np.array([entry_id], dtype=np.int64))
+        # Keys go stale (e.g. after a content version bump); drop empty indexes
+        if index.ntotal == 0:
+            del self._indexes[key]
@@ -1,15 +1,24 @@
 from langchain.chains.base import Chain
 from langchain.schema import Document
-from langchain.callbacks.manager import CallbackManagerForChainRun
+from langchain.callbacks.manager import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
 from typing import Dict, List, Any, Optional
 import logging
 import asyncio
+from cachetools import TTLCache
 
 from app.services.multimodal_processor import MultimodalProcessor
-from app.services.vector_store import MultimodalVectorStoreService
+from app.services.vector_store import MultimodalVectorStoreService, get_content_version
+from app.core.event_loop import run_sync
 
 logger = logging.getLogger(__name__)
 
+# Repeated queries (refreshes, autocomplete) reuse recent analysis and retrieval
+QUERY_CACHE_SIZE = 256
+QUERY_CACHE_TTL = 300  # 5 minutes
+
+_query_meta_cache = TTLCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+_search_cache = TTLCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+
 class MultimodalChain(Chain):
     """Chain for processing multimodal queries across text, tables, and images"""
     
@@ -35,49 +44,48 @@ class MultimodalChain(Chain):
         run_manager: Optional[CallbackManagerForChainRun] = None,
     ) -> Dict[str, Any]:
         """Execute the multimodal chain"""
+        return run_sync(self._acall(inputs))
+    
+    async def _acall(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        """Execute the multimodal chain on the running event loop"""
         
         query = inputs["query"]
         content_types = inputs.get("content_types", ["text", "table", "image"])
         k_per_type = inputs.get("k_per_type", 5)
         
         if run_manager:
-            run_manager.on_text(f"Processing multimodal query: {query}", verbose=True)
+            await run_manager.on_text(f"Processing multimodal query: {query}", verbose=True)
         
-        # Detect query intent and optimize retrieval
-        intent = asyncio.run(
-            self.multimodal_processor.detect_query_intent(query)
-        )
-        
-        if run_manager:
-            run_manager.on_text(f"Detected intent: {intent.get('primary_intent', 'unknown')}", verbose=True)
-        
-        # Retrieve relevant content from all modalities
-        search_results = asyncio.run(
-            self.vector_service.search_multimodal(
-                query=query,
-                content_types=content_types,
-                k_per_type=k_per_type
-            )
+        # Query analysis (intent and modality relevance in a single LLM call)
+        # is independent of retrieval, so run both concurrently
+        query_meta, search_results = await asyncio.gather(
+            self._analyze_query(query),
+            self._search(query, content_types, k_per_type)
         )
+        intent = query_meta["intent"]
         
         total_results = sum(len(docs) for docs in search_results.values())
         if run_manager:
-            run_manager.on_text(f"Retrieved {total_results} documents across modalities", verbose=True)
+            await run_manager.on_text(f"Detected intent: {intent.get('primary_intent', 'unknown')}", verbose=True)
+            await run_manager.on_text(f"Retrieved {total_results} documents across modalities", verbose=True)
         
         # Process through multimodal processor
-        multimodal_result = asyncio.run(
-            self.multimodal_processor.process_multimodal_query(
-                query=query,
-                text_docs=search_results.get("text", []),
-                table_docs=search_results.get("table", []),
-                image_docs=search_results.get("image", [])
-            )
+        multimodal_result = await self.multimodal_processor.process_multimodal_query(
+            query=query,
+            text_docs=search_results.get("text", []),
+            table_docs=search_results.get("table", []),
+            image_docs=search_results.get("image", []),
+            modality_relevance=query_meta["modality_relevance"]
         )
         
         # Calculate overall confidence
         confidence = self._calculate_confidence(
             multimodal_result, 
-            search_results, 
+            total_results, 
             intent
         )
         
@@ -94,10 +102,40 @@ class MultimodalChain(Chain):
             "relevance_scores": multimodal_result["relevance_scores"]
         }
     
+    async def _analyze_query(self, query: str) -> Dict[str, Any]:
+        """Analyze a query, reusing a recent result for the same query"""
+        key = query.strip().lower()
+        if key in _query_meta_cache:
+            return _query_meta_cache[key]
+        
+        query_meta = await self.multimodal_processor.analyze_query(query)
+        _query_meta_cache[key] = query_meta
+        return query_meta
+    
+    async def _search(
+        self,
+        query: str,
+        content_types: List[str],
+        k_per_type: int
+    ) -> Dict[str, List[Document]]:
+        """Search all modalities, reusing recent results for the same request"""
+        # Keyed on the content version so uploads invalidate earlier results
+        key = (get_content_version(), query, tuple(sorted(content_types)), k_per_type)
+        if key in _search_cache:
+            return _search_cache[key]
+        
+        search_results = await self.vector_service.search_multimodal(
+            query=query,
+            content_types=content_types,
+            k_per_type=k_per_type
+        )
+        _search_cache[key] = search_results
+        return search_results
+    
     def _calculate_confidence(
         self, 
         multimodal_result: Dict[str, Any],
-        search_results: Dict[str, List[Document]],
+        total_docs: int,
         intent: Dict[str, Any]
     ) -> float:
         """Calculate confidence score for multimodal response"""
@@ -109,7 +147,6 @@ class MultimodalChain(Chain):
         base_confidence += active_modalities * 0.1
         
         # More documents = higher confidence
-        total_docs = sum(len(docs) for docs in search_results.values())
         if total_docs > 5:
             base_confidence += 0.2
         elif total_docs > 2:
@@ -129,12 +166,22 @@ class MultimodalChain(Chain):
     def _format_multimodal_sources(self, search_results: Dict[str, List[Document]]) -> List[Dict[str, Any]]:
         """Format source information for multimodal results"""
         sources = []
+        seen = set()
         
         for content_type, docs in search_results.items():
             for doc in docs:
+                page_number = doc.metadata.get("page_number", "Unknown")
+                item_id = doc.metadata.get("table_id") or doc.metadata.get("image_id")
+                
+                # Several chunks of one page or item make a single source
+                key = (content_type, page_number, item_id)
+                if key in seen:
+                    continue
+                seen.add(key)
+                
                 source_info = {
                     "content_type": content_type,
-                    "page_number": doc.metadata.get("page_number", "Unknown"),
+                    "page_number": page_number,
                     "relevance": getattr(doc, 'relevance_score', 0.8)
                 }
                 
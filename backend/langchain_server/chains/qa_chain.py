@@ -1,15 +1,203 @@
 from langchain.chains.base import Chain
 from langchain.schema import Document
-from langchain.callbacks.manager import CallbackManagerForChainRun
-from typing import Dict, List, Any, Optional
+from langchain.callbacks.manager import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+from typing import Dict, List, Any, Optional, AsyncIterator, Tuple
 import logging
 import asyncio
+import re
+import itertools
+from functools import lru_cache
+from bisect import bisect_right
+import numpy as np
+import pandas as pd
+from cachetools import TTLCache
 
-from app.services.vector_store import MultimodalVectorStoreService
+from app.services.vector_store import MultimodalVectorStoreService, get_content_version
 from app.services.llm_service import AdvancedLLMService
+from app.core.config import settings
+from langchain_server.chains.answer_cache import SemanticAnswerCache
+from app.core.event_loop import run_sync
 
 logger = logging.getLogger(__name__)
 
+# Near-duplicate questions reuse a recent answer instead of retrieval + generation
+_answer_cache = SemanticAnswerCache(
+    max_size=settings.ANSWER_CACHE_SIZE,
+    ttl=settings.ANSWER_CACHE_TTL,
+    threshold=settings.ANSWER_CACHE_THRESHOLD
+)
+
+# Exact repeats of a question within a session reuse recent retrieval results
+SEARCH_CACHE_SIZE = 512
+SEARCH_CACHE_TTL = 60  # 1 minute
+
+_search_cache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+
+# Static per-question-type instructions. They go into the system message ahead
+# of the retrieved context so every prompt of a type shares the same prefix,
+# which lets provider-side prompt caching skip re-processing it
+_FACTUAL_INSTRUCTIONS = """Answer this factual question based on the provided context.
+Instructions:
+- Provide a direct, factual answer
+- Use exact information from the context
+- Include specific page references if available
+- If the answer isn't in the context, say so clearly
+- Keep the answer concise but complete
+"""
+
+_ANALYTICAL_INSTRUCTIONS = """Provide a thorough analytical answer to this question.
+Instructions:
+- Analyze the information deeply
+- Explain the reasoning behind your answer
+- Consider multiple perspectives if applicable
+- Use evidence from the context to support your analysis
+- Structure your answer logically
+- Be comprehensive but clear
+"""
+
+_NUMERICAL_INSTRUCTIONS = """Answer this numerical question using the provided data.
+Instructions:
+- Perform necessary calculations
+- Show your work step by step
+- Provide exact numbers where possible
+- Include units and context
+- Verify calculations are logical
+- If data is insufficient, explain what's missing
+"""
+
+_GENERAL_INSTRUCTIONS = """Answer this question based on the available information.
+Instructions:
+- Provide a helpful and informative answer
+- Use information from the context
+- Be clear and well-structured
+- Include relevant details
+- If information is limited, acknowledge it
+"""
+
+# Question keywords by type, in the order the types win when several match
+_QUESTION_KEYWORDS = {
+    "factual": ("what is", "who is", "where is", "when", "define"),
+    "analytical": ("why", "how", "analyze", "explain", "compare"),
+    "numerical": ("how much", "how many", "calculate", "total", "average"),
+    "list": ("list", "name", "identify", "which"),
+}
+
+# One alternation with a named group per type; earlier alternatives win at the same position
+_QUESTION_KEYWORD_PATTERN = re.compile("|".join(
+    f"(?P<{question_type}>{'|'.join(map(re.escape, keywords))})"
+    for question_type, keywords in _QUESTION_KEYWORDS.items()
+))
+
+_QUESTION_TYPE_PRIORITY = tuple(_QUESTION_KEYWORDS)
+_QUESTION_TYPE_RANK = {question_type: rank for rank, question_type in enumerate(_QUESTION_TYPE_PRIORITY)}
+
+# No keyword is shorter than this, so shorter questions cannot match any type
+_MIN_KEYWORD_LENGTH = min(len(keyword) for keywords in _QUESTION_KEYWORDS.values() for keyword in keywords)
+
+@lru_cache(maxsize=4096)
+def _classify_question_text(question_lower: str) -> str:
+    """Classify a lowercased question in a single keyword scan"""
+    best_rank = len(_QUESTION_TYPE_PRIORITY)
+    
+    for match in _QUESTION_KEYWORD_PATTERN.finditer(question_lower):
+        best_rank = min(best_rank, _QUESTION_TYPE_RANK[match.lastgroup])
+        # Nothing can outrank a factual question, so stop scanning
+        if best_rank == 0:
+            break
+    
+    return _QUESTION_TYPE_PRIORITY[best_rank] if best_rank < len(_QUESTION_TYPE_PRIORITY) else "general"
+
+# Character budgets for retrieved context; short chunks leave room for more
+# documents than the per-type slices used to allow
+_FACTUAL_CONTEXT_CHARS = 1500
+_ANALYTICAL_CONTEXT_CHARS = 4000
+_GENERAL_CONTEXT_CHARS = 2400
+
+# Chunks sharing this many leading characters are treated as duplicates
+_DEDUP_PREFIX_CHARS = 128
+
+def _select_context_docs(docs: List[Document], chars_per_doc: int, max_chars: int) -> List[Document]:
+    """Drop duplicate chunks and keep documents, in rank order, within a character budget"""
+    seen = set()
+    unique_docs = []
+    for doc in docs:
+        prefix = doc.page_content[:_DEDUP_PREFIX_CHARS]
+        if prefix not in seen:
+            seen.add(prefix)
+            unique_docs.append(doc)
+    
+    if not unique_docs:
+        return unique_docs
+    
+    lengths = np.fromiter((len(doc.page_content) for doc in unique_docs), dtype=np.int64, count=len(unique_docs))
+    used = np.cumsum(np.minimum(lengths, chars_per_doc))
+    keep = int(np.searchsorted(used, max_chars, side="right"))
+    
+    return unique_docs[:max(keep, 1)]
+
+# Display labels for the content types the vector store tags documents with
+_CONTENT_TYPE_LABELS = {"text": "Text", "table": "Table", "image": "Image"}
+
+def _labelled_context(docs: List[Document], chars_per_doc: int) -> str:
+    """Join truncated documents, each prefixed with its content type and page"""
+    context_parts = []
+    
+    for doc in docs:
+        content_type = doc.metadata.get("content_type", "text")
+        label = _CONTENT_TYPE_LABELS.get(content_type) or content_type.title()
+        page_ref = doc.metadata.get("page_number", "Unknown")
+        context_parts.append(f"[{label} - Page {page_ref}] {doc.page_content[:chars_per_doc]}")
+    
+    return "\n\n".join(context_parts)
+
+# Characters of context echoed back as context_used, by question type
+_CONTEXT_USED_LIMITS = {"factual": 500, "analytical": 800, "numerical": 600, "general": 700}
+
+def _truncate(text: str, limit: int, suffix: str = "...") -> str:
+    """Cut text to limit characters, marking the cut with suffix"""
+    return text if len(text) <= limit else text[:limit] + suffix
+
+# Records summarized for numerical questions; statistics cover all of them
+_NUMERICAL_CONTEXT_RECORDS = 200
+
+_NUMERIC_STRIP = str.maketrans('', '', ',$')
+
+def _numeric_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Parse the columns whose every present value is a number, dropping the rest"""
+    numeric = {}
+    for column in df.columns:
+        values = df[column]
+        present = values.notna()
+        if not present.any():
+            continue
+        
+        parsed = pd.to_numeric(
+            values[present].astype(str).str.translate(_NUMERIC_STRIP).str.strip(),
+            errors="coerce"
+        )
+        if parsed.notna().all():
+            numeric[str(column)] = parsed.reindex(values.index)
+    
+    return pd.DataFrame(numeric, index=df.index)
+
+# Sources without a usable page number sort after every numbered page
+_UNKNOWN_PAGE_SORT_KEY = 10 ** 9
+
+def _page_sort_key(page_num: Any) -> int:
+    """Integer sort key for a page_number metadata value (an int from ingestion)"""
+    return page_num if isinstance(page_num, int) else _UNKNOWN_PAGE_SORT_KEY
+
+# Confidence starting points by question type
+_DEFAULT_BASE_CONFIDENCE = 0.6
+_QUESTION_TYPE_BASE_CONFIDENCE = {"factual": 0.7, "analytical": 0.5}
+
+# Confidence bonus for the number of retrieved sources, indexed by bisecting the thresholds
+_SOURCE_COUNT_THRESHOLDS = (3, 5)
+_SOURCE_COUNT_BONUS = (0.0, 0.1, 0.2)
+
+# Phrases that signal the answer is hedged; matched without lowercasing the answer
+_UNCERTAINTY_PATTERN = re.compile(r"i don't know|unclear|insufficient|cannot determine", re.IGNORECASE)
+
 class QAChain(Chain):
     """Question-Answering chain for PDF documents"""
     
@@ -35,96 +223,230 @@ class QAChain(Chain):
         run_manager: Optional[CallbackManagerForChainRun] = None,
     ) -> Dict[str, Any]:
         """Execute the Q&A chain"""
+        return run_sync(self._acall(inputs))
+    
+    async def _acall(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        """Execute the Q&A chain on the running event loop"""
         
         question = inputs["question"]
         context_types = inputs.get("context_types", ["text", "table"])
         max_sources = inputs.get("max_sources", 8)
         
         if run_manager:
-            run_manager.on_text(f"Answering question: {question}", verbose=True)
-        
-        # Retrieve relevant context
-        search_results = asyncio.run(
-            self.vector_service.search_multimodal(
-                query=question,
-                content_types=context_types,
-                k_per_type=max_sources // len(context_types)
-            )
-        )
+            await run_manager.on_text(f"Answering question: {question}", verbose=True)
         
-        # Determine question type for better answering
-        question_type = self._classify_question(question)
+        question_type, query_embedding, cache_key, cached_result = await self._classify_and_lookup(
+            question, context_types, max_sources
+        )
         
         if run_manager:
-            run_manager.on_text(f"Question type: {question_type}", verbose=True)
+            await run_manager.on_text(f"Question type: {question_type}", verbose=True)
         
-        # Generate answer based on question type
-        if question_type == "factual":
-            answer_result = asyncio.run(
-                self._answer_factual_question(question, search_results, run_manager)
-            )
-        elif question_type == "analytical":
-            answer_result = asyncio.run(
-                self._answer_analytical_question(question, search_results, run_manager)
-            )
-        elif question_type == "numerical":
-            answer_result = asyncio.run(
-                self._answer_numerical_question(question, search_results, run_manager)
-            )
+        if cached_result is not None:
+            return dict(cached_result)
+        
+        search_results = await self._search(question, context_types, max_sources, query_embedding)
+        answer_request, sources = await self._prepare_answer_and_sources(
+            question, question_type, search_results
+        )
+        
+        if "answer" in answer_request:
+            answer = answer_request["answer"]
         else:
-            answer_result = asyncio.run(
-                self._answer_general_question(question, search_results, run_manager)
+            answer = await self.llm_service.generate_response(
+                prompt=question,
+                context=answer_request["context"],
+                system_message=answer_request["system_message"]
             )
         
-        # Format sources
-        sources = self._format_qa_sources(search_results)
+        return self._finish_answer(
+            question, question_type, cache_key, query_embedding,
+            answer, answer_request["context_used"], sources, search_results
+        )
+    
+    async def astream_answer(self, inputs: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """Answer a question, streaming the answer text as it is generated
+        
+        Yields ``sources`` and ``question_type`` as soon as retrieval is done,
+        then one ``token`` event per answer chunk, and finally the
+        ``confidence`` and ``context_used`` computed from the full answer.
+        """
+        question = inputs["question"]
+        context_types = inputs.get("context_types", ["text", "table"])
+        max_sources = inputs.get("max_sources", 8)
+        
+        question_type, query_embedding, cache_key, cached_result = await self._classify_and_lookup(
+            question, context_types, max_sources
+        )
+        
+        if cached_result is not None:
+            yield {"sources": cached_result["sources"], "question_type": question_type}
+            yield {"token": cached_result["answer"]}
+            yield {"confidence": cached_result["confidence"], "context_used": cached_result["context_used"]}
+            return
+        
+        search_results = await self._search(question, context_types, max_sources, query_embedding)
+        answer_request, sources = await self._prepare_answer_and_sources(
+            question, question_type, search_results
+        )
         
-        # Calculate confidence
+        yield {"sources": sources, "question_type": question_type}
+        
+        if "answer" in answer_request:
+            answer = answer_request["answer"]
+            yield {"token": answer}
+        else:
+            answer_parts = []
+            async for token in self.llm_service.stream_response(
+                prompt=question,
+                context=answer_request["context"],
+                system_message=answer_request["system_message"]
+            ):
+                answer_parts.append(token)
+                yield {"token": token}
+            answer = "".join(answer_parts)
+        
+        result = self._finish_answer(
+            question, question_type, cache_key, query_embedding,
+            answer, answer_request["context_used"], sources, search_results
+        )
+        yield {"confidence": result["confidence"], "context_used": result["context_used"]}
+    
+    async def _classify_and_lookup(
+        self,
+        question: str,
+        context_types: List[str],
+        max_sources: int
+    ) -> Tuple[str, Optional[np.ndarray], tuple, Optional[Dict[str, Any]]]:
+        """Classify and embed the question, and look up a cached answer
+        
+        The answer cache key is returned so the answer is stored under the
+        content version it was retrieved from, even if an upload lands meanwhile.
+        """
+        # Classify the question while the embedding is in flight
+        embedding_task = asyncio.create_task(self._embed_question(question))
+        question_type = self._classify_question(question)
+        query_embedding = await embedding_task
+        
+        # Keyed on the content version so uploads invalidate earlier answers
+        cache_key = (get_content_version(), question_type, tuple(context_types), max_sources)
+        cached_result = None
+        if query_embedding is not None:
+            cached_result = _answer_cache.get(cache_key, query_embedding)
+        
+        return question_type, query_embedding, cache_key, cached_result
+    
+    def _finish_answer(
+        self,
+        question: str,
+        question_type: str,
+        cache_key: tuple,
+        query_embedding: Optional[np.ndarray],
+        answer: str,
+        context_used: str,
+        sources: List[str],
+        search_results: Dict[str, List[Document]]
+    ) -> Dict[str, Any]:
+        """Score a generated answer and add it to the answer cache"""
         confidence = self._calculate_qa_confidence(
             question, 
-            answer_result["answer"], 
+            answer, 
             search_results,
             question_type
         )
         
-        return {
-            "answer": answer_result["answer"],
+        result = {
+            "answer": answer,
             "sources": sources,
             "confidence": confidence,
-            "context_used": answer_result.get("context_used", ""),
+            "context_used": context_used,
             "question_type": question_type
         }
+        
+        if query_embedding is not None:
+            _answer_cache.put(cache_key, query_embedding, result)
+        
+        return dict(result)
+    
+    async def _search(
+        self,
+        question: str,
+        context_types: List[str],
+        max_sources: int,
+        query_embedding: Optional[np.ndarray]
+    ) -> Dict[str, List[Document]]:
+        """Retrieve context, reusing recent results for the same request"""
+        # Keyed on the content version so uploads invalidate earlier results
+        key = (get_content_version(), question, tuple(context_types), max_sources)
+        if key in _search_cache:
+            return _search_cache[key]
+        
+        search_results = await self.vector_service.search_multimodal(
+            query=question,
+            content_types=context_types,
+            k_per_type=max_sources // len(context_types),
+            query_embedding=query_embedding
+        )
+        _search_cache[key] = search_results
+        return search_results
+    
+    async def _embed_question(self, question: str) -> Optional[np.ndarray]:
+        """Embed the question, or return None so retrieval embeds it itself"""
+        try:
+            return await self.vector_service.embed_query(question)
+        except Exception as e:
+            logger.warning(f"Question embedding failed, skipping answer cache: {str(e)}")
+            return None
     
     def _classify_question(self, question: str) -> str:
         """Classify the type of question"""
-        question_lower = question.lower()
-        
-        # Factual questions
-        if any(word in question_lower for word in ["what is", "who is", "where is", "when", "define"]):
-            return "factual"
-        
-        # Analytical questions
-        elif any(word in question_lower for word in ["why", "how", "analyze", "explain", "compare"]):
-            return "analytical"
-        
-        # Numerical/calculation questions
-        elif any(word in question_lower for word in ["how much", "how many", "calculate", "total", "average"]):
-            return "numerical"
-        
-        # List/enumeration questions
-        elif any(word in question_lower for word in ["list", "name", "identify", "which"]):
-            return "list"
-        
-        else:
+        if len(question) < _MIN_KEYWORD_LENGTH:
             return "general"
+        return _classify_question_text(question.lower())
+    
+    async def _prepare_answer_and_sources(
+        self,
+        question: str,
+        question_type: str,
+        search_results: Dict[str, List[Document]]
+    ) -> Tuple[Dict[str, Any], List[str]]:
+        """Build the LLM request and format sources concurrently"""
+        if question_type == "numerical":
+            # The numerical context is a pandas summary; keep it off the event loop
+            prepare_task = asyncio.create_task(asyncio.to_thread(
+                self._prepare_answer, question, question_type, search_results
+            ))
+            sources = self._format_qa_sources(search_results)
+            return await prepare_task, sources
+        
+        return self._prepare_answer(question, question_type, search_results), self._format_qa_sources(search_results)
+    
+    def _prepare_answer(
+        self,
+        question: str,
+        question_type: str,
+        search_results: Dict[str, List[Document]]
+    ) -> Dict[str, Any]:
+        """Build the LLM request for a question, or a fallback answer when there is no context"""
+        if question_type == "factual":
+            return self._prepare_factual_answer(question, search_results)
+        elif question_type == "analytical":
+            return self._prepare_analytical_answer(question, search_results)
+        elif question_type == "numerical":
+            return self._prepare_numerical_answer(question, search_results)
+        else:
+            return self._prepare_general_answer(question, search_results)
     
-    async def _answer_factual_question(
+    def _prepare_factual_answer(
         self, 
         question: str, 
-        search_results: Dict[str, List[Document]],
-        run_manager: Optional[CallbackManagerForChainRun] = None
+        search_results: Dict[str, List[Document]]
     ) -> Dict[str, Any]:
-        """Answer factual questions with direct, concise responses"""
+        """Prepare a direct, concise answer to a factual question"""
         
         # Prioritize text sources for factual questions
         text_docs = search_results.get("text", [])
@@ -136,42 +458,23 @@ class QAChain(Chain):
             }
         
         # Build context from most relevant sources
-        context = self._build_factual_context(text_docs[:5])
-        
-        factual_prompt = f"""
-        Answer this factual question based on the provided context:
-        
-        Question: {question}
-        
-        Context: {context}
-        
-        Instructions:
-        - Provide a direct, factual answer
-        - Use exact information from the context
-        - Include specific page references if available
-        - If the answer isn't in the context, say so clearly
-        - Keep the answer concise but complete
-        """
-        
-        answer = await self.llm_service.generate_response(factual_prompt)
+        context = self._build_factual_context(text_docs)
         
         return {
-            "answer": answer,
-            "context_used": context[:500] + "..." if len(context) > 500 else context
+            "context": context,
+            "system_message": _FACTUAL_INSTRUCTIONS,
+            "context_used": _truncate(context, _CONTEXT_USED_LIMITS["factual"])
         }
     
-    async def _answer_analytical_question(
+    def _prepare_analytical_answer(
         self, 
         question: str, 
-        search_results: Dict[str, List[Document]],
-        run_manager: Optional[CallbackManagerForChainRun] = None
+        search_results: Dict[str, List[Document]]
     ) -> Dict[str, Any]:
-        """Answer analytical questions requiring reasoning and explanation"""
+        """Prepare an answer to an analytical question requiring reasoning and explanation"""
         
         # Use all available content types for analytical questions
-        all_docs = []
-        for docs in search_results.values():
-            all_docs.extend(docs)
+        all_docs = list(itertools.chain.from_iterable(search_results.values()))
         
         if not all_docs:
             return {
@@ -179,38 +482,20 @@ class QAChain(Chain):
                 "context_used": ""
             }
         
-        context = self._build_analytical_context(all_docs[:8])
-        
-        analytical_prompt = f"""
-        Provide a thorough analytical answer to this question:
-        
-        Question: {question}
-        
-        Context: {context}
-        
-        Instructions:
-        - Analyze the information deeply
-        - Explain the reasoning behind your answer
-        - Consider multiple perspectives if applicable
-        - Use evidence from the context to support your analysis
-        - Structure your answer logically
-        - Be comprehensive but clear
-        """
-        
-        answer = await self.llm_service.generate_response(analytical_prompt)
+        context = self._build_analytical_context(all_docs)
         
         return {
-            "answer": answer,
-            "context_used": context[:800] + "..." if len(context) > 800 else context
+            "context": context,
+            "system_message": _ANALYTICAL_INSTRUCTIONS,
+            "context_used": _truncate(context, _CONTEXT_USED_LIMITS["analytical"])
         }
     
-    async def _answer_numerical_question(
+    def _prepare_numerical_answer(
         self, 
         question: str, 
-        search_results: Dict[str, List[Document]],
-        run_manager: Optional[CallbackManagerForChainRun] = None
+        search_results: Dict[str, List[Document]]
     ) -> Dict[str, Any]:
-        """Answer numerical questions requiring calculations"""
+        """Prepare an answer to a numerical question requiring calculations"""
         
         # Prioritize table data for numerical questions
         table_docs = search_results.get("table", [])
@@ -227,42 +512,22 @@ class QAChain(Chain):
             if "table_data" in doc.metadata:
                 numerical_data.extend(doc.metadata["table_data"])
         
-        context = self._build_numerical_context(numerical_data[:20])
-        
-        numerical_prompt = f"""
-        Answer this numerical question using the provided data:
-        
-        Question: {question}
-        
-        Data: {context}
-        
-        Instructions:
-        - Perform necessary calculations
-        - Show your work step by step
-        - Provide exact numbers where possible
-        - Include units and context
-        - Verify calculations are logical
-        - If data is insufficient, explain what's missing
-        """
-        
-        answer = await self.llm_service.generate_response(numerical_prompt)
+        context = self._build_numerical_context(numerical_data[:_NUMERICAL_CONTEXT_RECORDS])
         
         return {
-            "answer": answer,
-            "context_used": context[:600] + "..." if len(context) > 600 else context
+            "context": context,
+            "system_message": _NUMERICAL_INSTRUCTIONS,
+            "context_used": _truncate(context, _CONTEXT_USED_LIMITS["numerical"])
         }
     
-    async def _answer_general_question(
+    def _prepare_general_answer(
         self, 
         question: str, 
-        search_results: Dict[str, List[Document]],
-        run_manager: Optional[CallbackManagerForChainRun] = None
+        search_results: Dict[str, List[Document]]
     ) -> Dict[str, Any]:
-        """Answer general questions using all available context"""
+        """Prepare an answer to a general question using all available context"""
         
-        all_docs = []
-        for docs in search_results.values():
-            all_docs.extend(docs)
+        all_docs = list(itertools.chain.from_iterable(search_results.values()))
         
         if not all_docs:
             return {
@@ -270,104 +535,70 @@ class QAChain(Chain):
                 "context_used": ""
             }
         
-        context = self._build_general_context(all_docs[:6])
-        
-        general_prompt = f"""
-        Answer this question based on the available information:
-        
-        Question: {question}
-        
-        Context: {context}
-        
-        Instructions:
-        - Provide a helpful and informative answer
-        - Use information from the context
-        - Be clear and well-structured
-        - Include relevant details
-        - If information is limited, acknowledge it
-        """
-        
-        answer = await self.llm_service.generate_response(general_prompt)
+        context = self._build_general_context(all_docs)
         
         return {
-            "answer": answer,
-            "context_used": context[:700] + "..." if len(context) > 700 else context
+            "context": context,
+            "system_message": _GENERAL_INSTRUCTIONS,
+            "context_used": _truncate(context, _CONTEXT_USED_LIMITS["general"])
         }
     
     def _build_factual_context(self, docs: List[Document]) -> str:
         """Build context optimized for factual questions"""
-        context_parts = []
-        
-        for doc in docs:
-            page_ref = doc.metadata.get("page_number", "Unknown")
-            content = doc.page_content[:300]  # Shorter for factual
-            context_parts.append(f"[Page {page_ref}] {content}")
-        
-        return "\n\n".join(context_parts)
+        # Shorter for factual
+        return "\n\n".join(
+            f"[Page {doc.metadata.get('page_number', 'Unknown')}] {doc.page_content[:300]}"
+            for doc in _select_context_docs(docs, 300, _FACTUAL_CONTEXT_CHARS)
+        )
     
     def _build_analytical_context(self, docs: List[Document]) -> str:
         """Build context optimized for analytical questions"""
-        context_parts = []
-        
-        for doc in docs:
-            page_ref = doc.metadata.get("page_number", "Unknown")
-            content_type = doc.metadata.get("content_type", "text")
-            content = doc.page_content[:500]  # Longer for analysis
-            context_parts.append(f"[{content_type.title()} - Page {page_ref}] {content}")
-        
-        return "\n\n".join(context_parts)
+        return _labelled_context(_select_context_docs(docs, 500, _ANALYTICAL_CONTEXT_CHARS), 500)  # Longer for analysis
     
     def _build_numerical_context(self, data: List[Dict[str, Any]]) -> str:
         """Build context optimized for numerical questions"""
         if not data:
             return "No numerical data available."
         
+        df = pd.DataFrame(data)
+        
         context_parts = []
         context_parts.append(f"Available data ({len(data)} records):")
-        
-        # Show structure
-        if data:
-            columns = list(data[0].keys())
-            context_parts.append(f"Columns: {', '.join(columns)}")
+        context_parts.append(f"Columns: {', '.join(map(str, df.columns))}")
         
         # Show sample data
-        for i, record in enumerate(data[:5]):
-            context_parts.append(f"Record {i+1}: {record}")
+        context_parts.append("Sample records:")
+        context_parts.append(df.head(5).to_csv(sep="|", index=False).rstrip())
         
         if len(data) > 5:
             context_parts.append(f"... and {len(data) - 5} more records")
         
+        # Precomputed aggregates the answer can quote instead of recalculating
+        numeric_df = _numeric_columns(df)
+        if not numeric_df.empty:
+            stats = numeric_df.agg(["count", "sum", "mean", "min", "max"]).T.round(4)
+            context_parts.append("Column statistics:")
+            context_parts.append(stats.to_string())
+        
         return "\n".join(context_parts)
     
     def _build_general_context(self, docs: List[Document]) -> str:
         """Build general context from mixed document types"""
-        context_parts = []
-        
-        for doc in docs:
-            page_ref = doc.metadata.get("page_number", "Unknown")
-            content_type = doc.metadata.get("content_type", "text")
-            content = doc.page_content[:400]
-            context_parts.append(f"[{content_type.title()} - Page {page_ref}] {content}")
-        
-        return "\n\n".join(context_parts)
+        return _labelled_context(_select_context_docs(docs, 400, _GENERAL_CONTEXT_CHARS), 400)
     
     def _format_qa_sources(self, search_results: Dict[str, List[Document]]) -> List[str]:
         """Format sources for Q&A response"""
-        sources = []
-        
-        for content_type, docs in search_results.items():
-            for doc in docs:
-                page_num = doc.metadata.get("page_number", "Unknown")
-                source_text = f"Page {page_num}"
-                
-                if content_type != "text":
-                    source_text += f" ({content_type})"
-                
-                sources.append(source_text)
-        
-        # Remove duplicates and sort
-        unique_sources = list(set(sources))
-        return sorted(unique_sources, key=lambda x: int(x.split()[1]) if x.split()[1].isdigit() else 999)
+        # Unique (page, content type) pairs in first-seen order
+        pairs = dict.fromkeys(
+            (doc.metadata.get("page_number", "Unknown"), content_type)
+            for content_type, docs in search_results.items()
+            for doc in docs
+        )
+        
+        return [
+            f"Page {page_num}" if content_type == "text" else f"Page {page_num} ({content_type})"
+            for page_num, content_type in sorted(pairs, key=lambda pair: _page_sort_key(pair[0]))
+        ]
     
     def _calculate_qa_confidence(
         self, 
@@ -378,28 +609,20 @@ class QAChain(Chain):
     ) -> float:
         """Calculate confidence score for Q&A response"""
         
-        base_confidence = 0.6
-        
-        # Question type adjustments
-        if question_type == "factual":
-            base_confidence += 0.1  # Factual questions typically more confident
-        elif question_type == "analytical":
-            base_confidence -= 0.1  # Analytical questions more uncertain
+        # Question type sets the starting point: factual answers are typically
+        # more reliable, analytical ones more uncertain
+        base_confidence = _QUESTION_TYPE_BASE_CONFIDENCE.get(question_type, _DEFAULT_BASE_CONFIDENCE)
         
         # Source quantity
-        total_sources = sum(len(docs) for docs in search_results.values())
-        if total_sources >= 5:
-            base_confidence += 0.2
-        elif total_sources >= 3:
-            base_confidence += 0.1
+        total_sources = sum(map(len, search_results.values()))
+        base_confidence += _SOURCE_COUNT_BONUS[bisect_right(_SOURCE_COUNT_THRESHOLDS, total_sources)]
         
         # Answer length (reasonable answers are usually detailed)
         if 100 < len(answer) < 1000:
             base_confidence += 0.1
         
         # Check for uncertainty indicators in answer
-        uncertainty_phrases = ["i don't know", "unclear", "insufficient", "cannot determine"]
-        if any(phrase in answer.lower() for phrase in uncertainty_phrases):
+        if _UNCERTAINTY_PATTERN.search(answer):
             base_confidence -= 0.3
         
         return max(0.1, min(1.0, base_confidence))
\ No newline at end of file
@@ -1,19 +1,54 @@
-from typing import Dict, Any, List, TypedDict
+from typing import Dict, Any, List, TypedDict, Optional
 from langgraph.graph import StateGraph, END
 import logging
 import asyncio
+import orjson
+from bisect import bisect_left
 
+from app.core.config import settings
 from app.services.analytics_service import AnalyticsService
 from app.services.vector_store import MultimodalVectorStoreService
-from app.services.llm_service import AdvancedLLMService
+from app.services.llm_service import AdvancedLLMService, parse_llm_json
 from app.utils.chart_generator import ChartGenerator
+from langchain_server.graphs.search_cache import cached_search_multimodal
 
 logger = logging.getLogger(__name__)
 
+# Records and characters of raw data shown to the LLM in analysis prompts
+_SAMPLE_PREVIEW_RECORDS = 5
+_SAMPLE_PREVIEW_CHARS = 2000
+
+# Confidence reported when retrieval found no table data to analyze
+_NO_DATA_CONFIDENCE = 0.1
+
+# Confidence scoring: bonus for more than 20 / more than 50 data records,
+# indexed by bisecting the thresholds, plus fixed per-signal bonuses
+_BASE_CONFIDENCE = 0.5
+_DATA_COUNT_THRESHOLDS = (20, 50)
+_DATA_COUNT_BONUS = (0.0, 0.1, 0.2)
+_DETAILED_ANALYSIS_CHARS = 200
+_SIGNAL_BONUS = 0.1
+_ANALYSIS_TYPE_BONUS = {"trend_analysis": 0.05, "summary": 0.05}  # These tend to be more reliable
+
+# Analysis text used when the LLM did not answer within the node timeout
+_TIMED_OUT_ANALYSIS = "The analysis timed out; only basic statistics are available."
+
+def _sample_preview(data: List[Dict[str, Any]]) -> str:
+    """Serialize the first few records once, bounded so prompts stay small"""
+    if not data:
+        return "No data"
+    preview = orjson.dumps(
+        data[:_SAMPLE_PREVIEW_RECORDS],
+        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        default=str
+    ).decode()
+    return preview[:_SAMPLE_PREVIEW_CHARS]
+
 class AnalyticsState(TypedDict):
     query: str
     analysis_type: str
     raw_data: List[Dict[str, Any]]
+    sample_preview: str
     processed_data: Dict[str, Any]
     insights: List[str]
     charts: Dict[str, Any]
@@ -40,11 +75,10 @@ class AnalyticsGraph:
         workflow.add_node("classify_query", self._classify_query)
         workflow.add_node("gather_data", self._gather_data)
         workflow.add_node("process_data", self._process_data)
-        workflow.add_node("generate_insights", self._generate_insights)
-        workflow.add_node("create_visualizations", self._create_visualizations)
-        workflow.add_node("formulate_recommendations", self._formulate_recommendations)
+        workflow.add_node("enrich", self._enrich)
         workflow.add_node("calculate_confidence", self._calculate_confidence)
         workflow.add_node("handle_error", self._handle_error)
+        workflow.add_node("handle_no_data", self._handle_no_data)
         
         # Define the workflow
         workflow.set_entry_point("classify_query")
@@ -59,13 +93,22 @@ class AnalyticsGraph:
             }
         )
         
-        workflow.add_edge("gather_data", "process_data")
-        workflow.add_edge("process_data", "generate_insights")
-        workflow.add_edge("generate_insights", "create_visualizations")
-        workflow.add_edge("create_visualizations", "formulate_recommendations")
-        workflow.add_edge("formulate_recommendations", "calculate_confidence")
+        # Skip the LLM-backed nodes when retrieval found nothing to analyze
+        workflow.add_conditional_edges(
+            "gather_data",
+            self._should_process_data,
+            {
+                "continue": "process_data",
+                "no_data": "handle_no_data",
+                "error": "handle_error"
+            }
+        )
+        
+        workflow.add_edge("process_data", "enrich")
+        workflow.add_edge("enrich", "calculate_confidence")
         workflow.add_edge("calculate_confidence", END)
         workflow.add_edge("handle_error", END)
+        workflow.add_edge("handle_no_data", END)
         
         return workflow.compile()
     
@@ -76,7 +119,7 @@ class AnalyticsGraph:
             analysis_type = self.analytics_service.classify_query_type(query)
             
             state["analysis_type"] = analysis_type
-            logger.info(f"Classified query as: {analysis_type}")
+            logger.info("Classified query as: %s", analysis_type)
             
         except Exception as e:
             state["error"] = f"Query classification failed: {str(e)}"
@@ -102,10 +145,8 @@ class AnalyticsGraph:
                 k_per_type = 8
             
             # Search for relevant content
-            search_results = await self.vector_service.search_multimodal(
-                query=query,
-                content_types=content_types,
-                k_per_type=k_per_type
+            search_results = await cached_search_multimodal(
+                self.vector_service, query, content_types, k_per_type
             )
             
             # Extract table data
@@ -114,7 +155,12 @@ class AnalyticsGraph:
             )
             
             state["raw_data"] = table_data
-            logger.info(f"Gathered {len(table_data)} data points from {sum(len(docs) for docs in search_results.values())} documents")
+            # The document count is only worth summing when the line is emitted
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(
+                    "Gathered %d data points from %d documents",
+                    len(table_data), sum(map(len, search_results.values()))
+                )
             
         except Exception as e:
             state["error"] = f"Data gathering failed: {str(e)}"
@@ -129,26 +175,25 @@ class AnalyticsGraph:
             raw_data = state["raw_data"]
             analysis_type = state["analysis_type"]
             
-            if not raw_data:
-                state["processed_data"] = {
-                    "analysis": "No relevant data found for analysis.",
-                    "statistics": {},
-                    "summary": "Insufficient data for meaningful analysis."
-                }
-                return state
+            # Shared by the comparison and general analysis prompts
+            state["sample_preview"] = _sample_preview(raw_data)
             
             # Perform analysis based on type
             if analysis_type == "trend_analysis":
                 processed_data = await self._process_trend_data(query, raw_data)
             elif analysis_type == "comparison":
-                processed_data = await self._process_comparison_data(query, raw_data)
+                processed_data = await self._process_comparison_data(
+                    query, raw_data, state["sample_preview"]
+                )
             elif analysis_type == "summary":
                 processed_data = await self._process_summary_data(query, raw_data)
             else:
-                processed_data = await self._process_general_data(query, raw_data)
+                processed_data = await self._process_general_data(
+                    query, raw_data, state["sample_preview"]
+                )
             
             state["processed_data"] = processed_data
-            logger.info(f"Processed data for {analysis_type} analysis")
+            logger.info("Processed data for %s analysis", analysis_type)
             
         except Exception as e:
             state["error"] = f"Data processing failed: {str(e)}"
@@ -156,13 +201,30 @@ class AnalyticsGraph:
         
         return state
     
+    async def _enrich(self, state: AnalyticsState) -> AnalyticsState:
+        """Build charts while insights and the recommendations drawn from them are generated"""
+        
+        async def insights_then_recommendations():
+            await self._generate_insights(state)
+            await self._formulate_recommendations(state)
+        
+        # Charts only need the raw data, so they don't wait on either LLM call
+        await asyncio.gather(
+            insights_then_recommendations(),
+            self._create_visualizations(state)
+        )
+        
+        return state
+    
     async def _generate_insights(self, state: AnalyticsState) -> AnalyticsState:
         """Generate insights from processed data"""
         try:
             processed_data = state["processed_data"]
             raw_data = state["raw_data"]
             
-            if "analysis" in processed_data:
+            if processed_data.get("timed_out"):
+                insights = ["Analysis timed out, so no insights were generated; see the basic statistics."]
+            elif "analysis" in processed_data:
                 insights = await self.analytics_service.extract_insights(
                     processed_data["analysis"],
                     raw_data
@@ -171,7 +233,7 @@ class AnalyticsGraph:
                 insights = ["No insights could be generated from the available data."]
             
             state["insights"] = insights
-            logger.info(f"Generated {len(insights)} insights")
+            logger.info("Generated %d insights", len(insights))
             
         except Exception as e:
             state["error"] = f"Insight generation failed: {str(e)}"
@@ -189,29 +251,15 @@ class AnalyticsGraph:
             charts = {}
             
             if raw_data and analysis_type in ["trend_analysis", "comparison"]:
-                # Create mock table documents for chart generation
-                from langchain.schema import Document
-                
-                table_docs = [
-                    Document(
-                        page_content=f"Table data: {raw_data[:5]}",  # Sample data
-                        metadata={
-                            "content_type": "table",
-                            "table_data": raw_data,
-                            "page_number": 1
-                        }
-                    )
-                ]
-                
-                chart_result = await self.chart_generator.generate_chart_from_query(
-                    query, table_docs
+                chart_result = await self.chart_generator.generate_chart_from_records(
+                    query, raw_data
                 )
                 
                 if chart_result:
                     charts = chart_result
             
             state["charts"] = charts
-            logger.info(f"Created visualizations: {bool(charts)}")
+            logger.info("Created visualizations: %s", bool(charts))
             
         except Exception as e:
             state["error"] = f"Visualization creation failed: {str(e)}"
@@ -239,23 +287,28 @@ class AnalyticsGraph:
             3. Have clear business value
             4. Are prioritized by impact
             
-            Return as a JSON array of strings.
+            Respond with only a JSON object of this form:
+            {{"recommendations": ["recommendation 1", "recommendation 2"]}}
             """
             
-            response = await self.llm_service.generate_response(recommendations_prompt)
+            response = await self._generate_within_timeout(recommendations_prompt)
+            if response is None:
+                state["recommendations"] = []
+                return state
             
             try:
-                import json
-                recommendations = json.loads(response)
+                # Tolerates prose around the object, so a chatty reply still parses
+                parsed = parse_llm_json(response)
+                recommendations = parsed.get("recommendations") if isinstance(parsed, dict) else parsed
                 if not isinstance(recommendations, list):
                     recommendations = [response]
-            except:
+            except ValueError:
                 # Fallback: split by lines
                 recommendations = [line.strip() for line in response.split('\n') if line.strip()]
                 recommendations = [rec for rec in recommendations if len(rec) > 10][:5]
             
             state["recommendations"] = recommendations
-            logger.info(f"Generated {len(recommendations)} recommendations")
+            logger.info("Generated %d recommendations", len(recommendations))
             
         except Exception as e:
             state["error"] = f"Recommendation generation failed: {str(e)}"
@@ -271,33 +324,19 @@ class AnalyticsGraph:
             insights = state["insights"]
             charts = state["charts"]
             
-            confidence = 0.5  # Base confidence
-            
             # Data quantity factor
-            if len(raw_data) > 50:
-                confidence += 0.2
-            elif len(raw_data) > 20:
-                confidence += 0.1
+            confidence = _BASE_CONFIDENCE + _DATA_COUNT_BONUS[bisect_left(_DATA_COUNT_THRESHOLDS, len(raw_data))]
             
-            # Analysis quality factor
-            if len(processed_data.get("analysis", "")) > 200:
-                confidence += 0.1
-            
-            # Insights factor
-            if len(insights) >= 3:
-                confidence += 0.1
-            
-            # Visualization factor
-            if charts:
-                confidence += 0.1
+            # Analysis quality, insights and visualization factors
+            confidence += _SIGNAL_BONUS * (len(processed_data.get("analysis", "")) > _DETAILED_ANALYSIS_CHARS)
+            confidence += _SIGNAL_BONUS * (len(insights) >= 3)
+            confidence += _SIGNAL_BONUS * bool(charts)
             
             # Analysis type factor
-            analysis_type = state["analysis_type"]
-            if analysis_type in ["trend_analysis", "summary"]:
-                confidence += 0.05  # These tend to be more reliable
+            confidence += _ANALYSIS_TYPE_BONUS.get(state["analysis_type"], 0.0)
             
             state["confidence"] = min(1.0, confidence)
-            logger.info(f"Calculated confidence: {state['confidence']:.2f}")
+            logger.info("Calculated confidence: %.2f", state["confidence"])
             
         except Exception as e:
             state["error"] = f"Confidence calculation failed: {str(e)}"
@@ -329,6 +368,30 @@ class AnalyticsGraph:
             return "error"
         return "continue"
     
+    async def _handle_no_data(self, state: AnalyticsState) -> AnalyticsState:
+        """Answer without analysis when no table data was found"""
+        logger.info("No data found for analytics query, skipping analysis")
+        
+        state["processed_data"] = {
+            "analysis": "No relevant data found for analysis.",
+            "statistics": {},
+            "summary": "Insufficient data for meaningful analysis."
+        }
+        state["insights"] = []
+        state["charts"] = {}
+        state["recommendations"] = []
+        state["confidence"] = _NO_DATA_CONFIDENCE
+        
+        return state
+    
+    def _should_process_data(self, state: AnalyticsState) -> str:
+        """Determine whether gathered data is worth analyzing"""
+        if state.get("error"):
+            return "error"
+        if not state["raw_data"]:
+            return "no_data"
+        return "continue"
+    
     async def _process_trend_data(self, query: str, data: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Process data for trend analysis"""
         
@@ -343,14 +406,19 @@ class AnalyticsGraph:
             "statistics": self._calculate_basic_stats(data)
         }
     
-    async def _process_comparison_data(self, query: str, data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def _process_comparison_data(
+        self,
+        query: str,
+        data: List[Dict[str, Any]],
+        sample_preview: str
+    ) -> Dict[str, Any]:
         """Process data for comparison analysis"""
         
         comparison_prompt = f"""
         Perform a comparative analysis based on this query: {query}
         
         Data available: {len(data)} records
-        Sample: {data[:3] if data else "No data"}
+        Sample: {sample_preview}
         
         Identify:
         1. Key metrics being compared
@@ -359,7 +427,9 @@ class AnalyticsGraph:
         4. Statistical significance
         """
         
-        analysis = await self.llm_service.generate_response(comparison_prompt)
+        analysis = await self._generate_within_timeout(comparison_prompt)
+        if analysis is None:
+            return self._timed_out_result(self._calculate_basic_stats(data))
         
         return {
             "analysis": analysis,
@@ -386,7 +456,9 @@ class AnalyticsGraph:
         4. Overall assessment
         """
         
-        analysis = await self.llm_service.generate_response(summary_prompt)
+        analysis = await self._generate_within_timeout(summary_prompt)
+        if analysis is None:
+            return self._timed_out_result(stats)
         
         return {
             "analysis": analysis,
@@ -394,19 +466,26 @@ class AnalyticsGraph:
             "statistics": stats
         }
     
-    async def _process_general_data(self, query: str, data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def _process_general_data(
+        self,
+        query: str,
+        data: List[Dict[str, Any]],
+        sample_preview: str
+    ) -> Dict[str, Any]:
         """Process data for general analysis"""
         
         general_prompt = f"""
         Analyze the data to answer: {query}
         
         Available data: {len(data)} records
-        Sample data: {data[:5] if data else "No data"}
+        Sample data: {sample_preview}
         
         Provide a thorough analysis addressing the query.
         """
         
-        analysis = await self.llm_service.generate_response(general_prompt)
+        analysis = await self._generate_within_timeout(general_prompt)
+        if analysis is None:
+            return self._timed_out_result(self._calculate_basic_stats(data))
         
         return {
             "analysis": analysis,
@@ -414,15 +493,38 @@ class AnalyticsGraph:
             "statistics": self._calculate_basic_stats(data)
         }
     
+    async def _generate_within_timeout(self, prompt: str) -> Optional[str]:
+        """Generate an LLM response, or None if it takes longer than the node timeout"""
+        try:
+            async with asyncio.timeout(settings.LLM_NODE_TIMEOUT):
+                return await self.llm_service.generate_response(prompt)
+        except TimeoutError:
+            logger.warning(f"LLM call timed out after {settings.LLM_NODE_TIMEOUT}s")
+            return None
+    
+    def _timed_out_result(self, stats: Dict[str, Any]) -> Dict[str, Any]:
+        """Processed data for an analysis whose LLM call timed out"""
+        return {
+            "analysis": _TIMED_OUT_ANALYSIS,
+            "statistics": stats,
+            "timed_out": True
+        }
+    
     def _calculate_basic_stats(self, data: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Calculate basic statistics for the data"""
         if not data:
             return {}
         
+        # set.update iterates each record's keys in C, without keys() views
+        columns = set()
+        add_columns = columns.update
+        for record in data:
+            add_columns(record)
+        
         return {
             "total_records": len(data),
-            "columns": list(set().union(*(d.keys() for d in data))) if data else [],
-            "sample_record": data[0] if data else {}
+            "columns": list(columns),
+            "sample_record": data[0]
         }
     
     async def process_analytics_query(self, query: str, analysis_type: str = None) -> Dict[str, Any]:
@@ -432,6 +534,7 @@ class AnalyticsGraph:
             query=query,
             analysis_type=analysis_type or "",
             raw_data=[],
+            sample_preview="",
             processed_data={},
             insights=[],
             charts={},
@@ -466,4 +569,13 @@ class AnalyticsGraph:
                 "confidence": 0.1,
                 "data_points": 0,
                 "error": str(e)
-            }
\ No newline at end of file
+            }
+
+_analytics_graph: Optional[AnalyticsGraph] = None
+
+def get_analytics_graph() -> AnalyticsGraph:
+    """Get the shared analytics graph, compiling it on first use"""
+    global _analytics_graph
+    if _analytics_graph is None:
+        _analytics_graph = AnalyticsGraph()
+    return _analytics_graph
@@ -1,17 +1,29 @@
-from typing import List, Dict, Any, TypedDict
+from typing import List, Dict, Any, TypedDict, AsyncIterator, Optional
 from langgraph.graph import StateGraph, END
 from langchain.schema import Document
+from app.core.config import settings
 from app.services.vector_store import MultimodalVectorStoreService
 from app.services.llm_service import AdvancedLLMService
 from app.utils.chart_generator import ChartGenerator
+from langchain_server.graphs.search_cache import cached_search_multimodal
 import logging
+import asyncio
+import re
 
 logger = logging.getLogger(__name__)
 
+def _keyword_pattern(keywords: List[str]) -> "re.Pattern":
+    """Compile keywords into one alternation so a query is scanned in a single pass"""
+    return re.compile("|".join(map(re.escape, keywords)))
+
+_TABLE_KEYWORD_PATTERN = _keyword_pattern(["table", "data", "statistics", "numbers", "trend", "chart"])
+_IMAGE_KEYWORD_PATTERN = _keyword_pattern(["image", "figure", "diagram", "photo", "picture"])
+_CHART_KEYWORD_PATTERN = _keyword_pattern(["trend", "chart", "graph", "visualization"])
+
 class RAGState(TypedDict):
     query: str
     retrieved_docs: Dict[str, List[Document]]
-    context: str
+    context_parts: List[str]
     response: str
     chart_data: Dict[str, Any]
     metadata: Dict[str, Any]
@@ -31,17 +43,15 @@ class MultimodalRAGGraph:
         workflow.add_node("retrieve", self._retrieve_documents)
         workflow.add_node("analyze_query", self._analyze_query)
         workflow.add_node("generate_context", self._generate_context)
-        workflow.add_node("generate_response", self._generate_response)
-        workflow.add_node("generate_charts", self._generate_charts)
+        workflow.add_node("generate_outputs", self._generate_outputs)
         workflow.add_node("finalize", self._finalize_response)
         
         # Add edges
         workflow.set_entry_point("analyze_query")
         workflow.add_edge("analyze_query", "retrieve")
         workflow.add_edge("retrieve", "generate_context")
-        workflow.add_edge("generate_context", "generate_response")
-        workflow.add_edge("generate_response", "generate_charts")
-        workflow.add_edge("generate_charts", "finalize")
+        workflow.add_edge("generate_context", "generate_outputs")
+        workflow.add_edge("generate_outputs", "finalize")
         workflow.add_edge("finalize", END)
         
         return workflow.compile()
@@ -53,15 +63,15 @@ class MultimodalRAGGraph:
         # Determine what content types to search
         content_types = ["text"]  # Always search text
         
-        if any(keyword in query for keyword in ["table", "data", "statistics", "numbers", "trend", "chart"]):
+        if _TABLE_KEYWORD_PATTERN.search(query):
             content_types.append("table")
         
-        if any(keyword in query for keyword in ["image", "figure", "diagram", "photo", "picture"]):
+        if _IMAGE_KEYWORD_PATTERN.search(query):
             content_types.append("image")
         
         state["metadata"] = {
             "content_types": content_types,
-            "requires_charts": any(keyword in query for keyword in ["trend", "chart", "graph", "visualization"])
+            "requires_charts": _CHART_KEYWORD_PATTERN.search(query) is not None
         }
         
         return state
@@ -71,10 +81,8 @@ class MultimodalRAGGraph:
         try:
             content_types = state["metadata"]["content_types"]
             
-            retrieved_docs = await self.vector_service.search_multimodal(
-                query=state["query"],
-                content_types=content_types,
-                k_per_type=5
+            retrieved_docs = await cached_search_multimodal(
+                self.vector_service, state["query"], content_types, 5
             )
             
             state["retrieved_docs"] = retrieved_docs
@@ -86,31 +94,50 @@ class MultimodalRAGGraph:
         return state
     
     async def _generate_context(self, state: RAGState) -> RAGState:
-        """Generate comprehensive context from retrieved documents"""
+        """Generate comprehensive context and the source list from retrieved documents"""
         context_parts = []
+        # Insertion-ordered set of "Page N (type)" labels for the sources footer
+        sources = {}
         
         for content_type, docs in state["retrieved_docs"].items():
             if docs:
+                label = content_type.title()
                 context_parts.append(f"\n=== {content_type.upper()} CONTENT ===")
                 
-                for i, doc in enumerate(docs):
+                for doc in docs:
                     page_ref = doc.metadata.get("page_number", "Unknown")
-                    context_parts.append(f"\n[{content_type.title()} from Page {page_ref}]")
-                    context_parts.append(doc.page_content)
+                    context_parts.append(f"\n[{label} from Page {page_ref}]\n{doc.page_content}")
+                    sources[f"Page {page_ref} ({content_type})"] = None
         
-        state["context"] = "\n".join(context_parts)
+        # Joined into the prompt by the LLM service, without an intermediate string
+        state["context_parts"] = context_parts
+        state["metadata"]["sources"] = list(sources)
+        return state
+    
+    async def _generate_outputs(self, state: RAGState) -> RAGState:
+        """Generate the response and charts concurrently"""
+        # Charts only need the retrieved tables, not the LLM response
+        await asyncio.gather(
+            self._generate_response(state),
+            self._generate_charts(state)
+        )
         return state
     
     async def _generate_response(self, state: RAGState) -> RAGState:
         """Generate response using LLM"""
         try:
-            response = await self.llm_service.generate_response(
-                prompt=state["query"],
-                context=state["context"]
-            )
+            async with asyncio.timeout(settings.LLM_NODE_TIMEOUT):
+                response = await self.llm_service.generate_response(
+                    prompt=state["query"],
+                    context=state["context_parts"]
+                )
             
             state["response"] = response
             
+        except TimeoutError:
+            logger.error(f"Response generation timed out after {settings.LLM_NODE_TIMEOUT}s")
+            state["response"] = "I apologize, but generating the response took too long. Please try again."
+            
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}")
             state["response"] = "I apologize, but I encountered an error while generating the response."
@@ -147,33 +174,95 @@ class MultimodalRAGGraph:
     async def _finalize_response(self, state: RAGState) -> RAGState:
         """Finalize the response with metadata"""
         # Add source information
-        sources = []
-        for content_type, docs in state["retrieved_docs"].items():
-            for doc in docs:
-                page_num = doc.metadata.get("page_number", "Unknown")
-                sources.append(f"Page {page_num} ({content_type})")
-        
-        if sources:
-            state["response"] += f"\n\n**Sources:** {', '.join(set(sources))}"
+        state["response"] += self._format_sources_footer(state["metadata"]["sources"])
         
         return state
     
-    async def process_query(self, query: str) -> Dict[str, Any]:
-        """Process a query through the RAG graph"""
-        initial_state = RAGState(
+    def _format_sources_footer(self, sources: List[str]) -> str:
+        """Format the sources line appended to a response"""
+        if not sources:
+            return ""
+        return f"\n\n**Sources:** {', '.join(sources)}"
+    
+    def _initial_state(self, query: str) -> RAGState:
+        return RAGState(
             query=query,
             retrieved_docs={},
-            context="",
+            context_parts=[],
             response="",
             chart_data={},
             metadata={}
         )
-        
-        result = await self.graph.ainvoke(initial_state)
+    
+    async def process_query(self, query: str) -> Dict[str, Any]:
+        """Process a query through the RAG graph"""
+        result = await self.graph.ainvoke(self._initial_state(query))
         
         return {
             "response": result["response"],
             "chart_data": result["chart_data"],
             "sources": list(result["retrieved_docs"].keys()),
             "metadata": result["metadata"]
-        }
\ No newline at end of file
+        }
+    
+    async def astream_query(self, query: str) -> AsyncIterator[Dict[str, Any]]:
+        """Process a query, streaming events as each stage completes
+        
+        Runs the same nodes as the graph, but yields the retrieved sources as
+        soon as retrieval finishes and the response text as the LLM produces
+        it. Events are ``sources``, then ``text`` chunks (the last one carries
+        the sources footer and ``is_final``), then ``chart`` when one was built.
+        """
+        state = self._initial_state(query)
+        state = await self._analyze_query(state)
+        state = await self._retrieve_documents(state)
+        state = await self._generate_context(state)
+        
+        yield {
+            "type": "sources",
+            "content": list(state["retrieved_docs"].keys()),
+            "metadata": state["metadata"]
+        }
+        
+        # Charts only need the retrieved tables, so build them during generation
+        chart_task = asyncio.create_task(self._generate_charts(state))
+        
+        try:
+            try:
+                async for token in self.llm_service.stream_response(
+                    prompt=state["query"],
+                    context=state["context_parts"]
+                ):
+                    yield {"type": "text", "content": token, "is_final": False}
+            except Exception as e:
+                logger.error(f"Error streaming response: {str(e)}")
+                yield {
+                    "type": "text",
+                    "content": "I apologize, but I encountered an error while generating the response.",
+                    "is_final": False
+                }
+            
+            yield {
+                "type": "text",
+                "content": self._format_sources_footer(state["metadata"]["sources"]),
+                "is_final": True
+            }
+            
+            state = await chart_task
+            if state["chart_data"]:
+                yield {"type": "chart", "content": state["chart_data"], "is_final": True}
+        finally:
+            # The client may disconnect and close the stream early
+            if not chart_task.done():
+                chart_task.cancel()
+
+_rag_graph: Optional[MultimodalRAGGraph] = None
+
+def get_rag_graph() -> MultimodalRAGGraph:
+    """Get the shared RAG graph, compiling it on first use"""
+    # The compiled graph holds no per-query state, so one instance serves
+    # every caller in the process
+    global _rag_graph
+    if _rag_graph is None:
+        _rag_graph = MultimodalRAGGraph()
+    return _rag_graph
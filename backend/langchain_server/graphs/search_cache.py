@@ -0,0 +1,91 @@
+from typing import Dict, List
+import asyncio
+import hashlib
+import logging
+from cachetools import TTLCache
+from langchain.schema import Document
+
+from app.services.vector_store import MultimodalVectorStoreService, get_content_version
+from langchain_server.chains.answer_cache import SemanticAnswerCache
+
+logger = logging.getLogger(__name__)
+
+# Retrieval results shared by every graph, so the RAG and analytics
+# pipelines both reuse searches for repeated or near-duplicate queries
+SEARCH_CACHE_SIZE = 2048
+SEARCH_CACHE_TTL = 3600  # 1 hour
+SEARCH_CACHE_THRESHOLD = 0.95  # Cosine similarity for a near-duplicate hit
+
+_exact_search_cache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+_similar_search_cache = SemanticAnswerCache(
+    max_size=SEARCH_CACHE_SIZE,
+    ttl=SEARCH_CACHE_TTL,
+    threshold=SEARCH_CACHE_THRESHOLD
+)
+
+# Searches currently running, so a concurrent identical search (e.g. the RAG
+# and analytics graphs handling the same query) waits for the first one
+_inflight_searches: Dict[tuple, asyncio.Task] = {}
+
+async def cached_search_multimodal(
+    vector_service: MultimodalVectorStoreService,
+    query: str,
+    content_types: List[str],
+    k_per_type: int
+) -> Dict[str, List[Document]]:
+    """Search all modalities, reusing results for identical or near-duplicate queries"""
+    # Keys include the content version so new uploads invalidate earlier results
+    search_key = (get_content_version(), tuple(content_types), k_per_type)
+    exact_key = (hashlib.sha256(query.encode("utf-8")).digest(),) + search_key
+
+    if exact_key in _exact_search_cache:
+        return _exact_search_cache[exact_key]
+
+    # Tasks belong to one event loop; only join a search started on this loop
+    pending = _inflight_searches.get(exact_key)
+    if pending is None or pending.get_loop() is not asyncio.get_running_loop():
+        pending = asyncio.create_task(_search_and_cache(
+            vector_service, query, content_types, k_per_type, search_key, exact_key
+        ))
+        _inflight_searches[exact_key] = pending
+        pending.add_done_callback(lambda task: _forget_search(exact_key, task))
+
+    # Shielded so one caller giving up does not cancel the search for the others
+    return await asyncio.shield(pending)
+
+def _forget_search(exact_key: tuple, task: asyncio.Task) -> None:
+    if _inflight_searches.get(exact_key) is task:
+        del _inflight_searches[exact_key]
+
+async def _search_and_cache(
+    vector_service: MultimodalVectorStoreService,
+    query: str,
+    content_types: List[str],
+    k_per_type: int,
+    search_key: tuple,
+    exact_key: tuple
+) -> Dict[str, List[Document]]:
+    try:
+        query_embedding = await vector_service.embed_query(query)
+    except Exception as e:
+        logger.warning(f"Query embedding failed, searching without the similarity cache: {str(e)}")
+        query_embedding = None
+
+    if query_embedding is not None:
+        search_results = _similar_search_cache.get(search_key, query_embedding)
+        if search_results is not None:
+            _exact_search_cache[exact_key] = search_results
+            return search_results
+
+    search_results = await vector_service.search_multimodal(
+        query=query,
+        content_types=content_types,
+        k_per_type=k_per_type,
+        query_embedding=query_embedding
+    )
+
+    _exact_search_cache[exact_key] = search_results
+    if query_embedding is not None:
+        _similar_search_cache.put(search_key, query_embedding, search_results)
+
+    return search_results
@@ -1,44 +1,82 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from langserve import add_routes
-from langchain.schema.runnable import RunnableLambda
-from langchain_server.chains.multimodal_chain import MultimodalRAGChain
-from langchain_server.graphs.rag_graph import MultimodalRAGGraph
-import asyncio
+from langchain.schema.runnable import Runnable, RunnableConfig, RunnableLambda
+from app.core.config import settings
+from app.core.event_loop import run_sync
+from app.core.workers import server_workers
+from langchain_server.chains.multimodal_chain import MultimodalChain
+from langchain_server.graphs.rag_graph import MultimodalRAGGraph, get_rag_graph
+from typing import Any, AsyncIterator, Dict, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
-def create_langserve_app() -> FastAPI:
-    """Create LangServe application"""
-    app = FastAPI(
-        title="Multimodal PDF RAG - LangServe",
-        description="LangChain server for multimodal PDF analysis",
-        version="1.0.0"
-    )
+class RAGGraphRunnable(Runnable[Dict[str, Any], Dict[str, Any]]):
+    """Runnable over the RAG graph whose stream yields events as stages finish
     
-    # Initialize services
-    rag_graph = MultimodalRAGGraph()
-    multimodal_chain = MultimodalRAGChain()
+    ``invoke`` returns the complete result as before, while ``/rag/stream``
+    sends sources first and then the response text as it is generated.
+    """
+    
+    def __init__(self, rag_graph: MultimodalRAGGraph):
+        self.rag_graph = rag_graph
+    
+    def invoke(self, input: Dict[str, Any], config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+        return run_sync(self.ainvoke(input, config))
     
-    # Create runnable for the RAG graph
-    async def process_query_runnable(query_dict):
-        """Runnable wrapper for RAG graph"""
-        query = query_dict.get("query", "")
+    async def ainvoke(
+        self,
+        input: Dict[str, Any],
+        config: Optional[RunnableConfig] = None,
+        **kwargs: Any
+    ) -> Dict[str, Any]:
+        query = input.get("query", "")
         if not query:
             return {"error": "No query provided"}
         
         try:
-            result = await rag_graph.process_query(query)
-            return result
+            return await self.rag_graph.process_query(query)
         except Exception as e:
             logger.error(f"Error in RAG processing: {str(e)}")
             return {"error": str(e)}
     
+    async def astream(
+        self,
+        input: Dict[str, Any],
+        config: Optional[RunnableConfig] = None,
+        **kwargs: Any
+    ) -> AsyncIterator[Dict[str, Any]]:
+        query = input.get("query", "")
+        if not query:
+            yield {"error": "No query provided"}
+            return
+        
+        try:
+            async for event in self.rag_graph.astream_query(query):
+                yield event
+        except Exception as e:
+            logger.error(f"Error in RAG streaming: {str(e)}")
+            yield {"error": str(e)}
+
+def create_langserve_app() -> FastAPI:
+    """Create LangServe application"""
+    app = FastAPI(
+        title="Multimodal PDF RAG - LangServe",
+        description="LangChain server for multimodal PDF analysis",
+        version="1.0.0",
+        default_response_class=ORJSONResponse
+    )
+    
+    # Initialize services
+    rag_graph = get_rag_graph()
+    multimodal_chain = MultimodalChain()
+    
     # Create runnable for multimodal chain
     async def multimodal_chain_runnable(input_dict):
         """Runnable wrapper for multimodal chain"""
         try:
-            result = await multimodal_chain.invoke(input_dict)
+            result = await multimodal_chain.ainvoke(input_dict)
             return result
         except Exception as e:
             logger.error(f"Error in multimodal chain: {str(e)}")
@@ -47,7 +85,7 @@ def create_langserve_app() -> FastAPI:
     # Add routes
     add_routes(
         app,
-        RunnableLambda(process_query_runnable),
+        RAGGraphRunnable(rag_graph),
         path="/rag"
     )
     
@@ -64,9 +102,18 @@ langserve_app = create_langserve_app()
 
 if __name__ == "__main__":
     import uvicorn
+    # Reload only works with a single process; otherwise size the pool to
+    # the CPUs available, as the main API server does.
+    # Workers import the app themselves, so each builds its own clients.
     uvicorn.run(
         "server:langserve_app",
         host="0.0.0.0",
         port=8001,
-        reload=True
+        reload=settings.DEBUG,
+        workers=None if settings.DEBUG else (settings.LANGSERVE_WORKERS or server_workers()),
+        loop="uvloop",
+        http="httptools",
+        # Drop idle connections quickly and shed load instead of queueing it
+        timeout_keep_alive=5,
+        limit_concurrency=200
     )
\ No newline at end of file
@@ -3,82 +3,118 @@ Startup script for the multimodal PDF RAG system
 """
 
 import asyncio
+import logging
 import sys
 import os
-import subprocess
 import time
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional
 
 # Add project root to path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
+from tenacity import retry, stop_after_attempt, wait_exponential
+
 from app.core.config import settings
+from app.core.workers import server_workers
 from app.services.database import db_service
-from app.services.vector_store import MultimodalVectorStoreService
+from app.services.vector_store import get_vector_store_service
 
-async def check_dependencies():
-    """Check if all dependencies are installed"""
+logger = logging.getLogger("startup")
+
+# Seconds a single connectivity/initialization check may take before it fails
+CHECK_TIMEOUT = 30
+
+# Seconds one EURI probe request may take; failures are retried with backoff
+EURI_PROBE_TIMEOUT = 5
+
+@lru_cache(maxsize=1)
+def _missing_dependency() -> Optional[str]:
+    """Import the core dependencies once; the import error, if any, is remembered"""
     try:
         import uvicorn
         import fastapi
         import langchain
         import euriai
-        print("✅ All Python dependencies are installed")
-        return True
     except ImportError as e:
-        print(f"❌ Missing dependency: {e}")
+        return str(e)
+    return None
+
+async def check_dependencies():
+    """Check if all dependencies are installed"""
+    missing = _missing_dependency()
+    if missing:
+        logger.error(f"❌ Missing dependency: {missing}")
         return False
+    logger.info("✅ All Python dependencies are installed")
+    return True
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=0.1, exp_base=1.5, max=2),
+    reraise=True
+)
+async def probe_euri(client):
+    """Send a minimal completion so a transient EURI failure is retried"""
+    # The SDK blocks, so run it off the loop
+    return await asyncio.wait_for(
+        asyncio.to_thread(client.generate_completion, prompt="test", max_tokens=1),
+        timeout=EURI_PROBE_TIMEOUT
+    )
 
 async def check_external_services():
     """Check external service connectivity"""
-    print("🔍 Checking external services...")
+    logger.info("🔍 Checking external services...")
     
     # Check EURI AI
     if not settings.EURI_API_KEY:
-        print("⚠️  EURI_API_KEY not configured")
+        logger.warning("⚠️  EURI_API_KEY not configured")
         return False
     
     try:
         from euriai import EuriaiClient
         client = EuriaiClient(api_key=settings.EURI_API_KEY)
         # Test with minimal request
-        response = client.generate_completion(prompt="test", max_tokens=1)
-        print("✅ EURI AI service is accessible")
+        response = await probe_euri(client)
+        logger.info("✅ EURI AI service is accessible")
     except Exception as e:
-        print(f"❌ EURI AI service error: {str(e)}")
+        logger.error(f"❌ EURI AI service error: {str(e)}")
         return False
     
     return True
 
 async def initialize_database():
     """Initialize database and create tables"""
-    print("🗄️  Initializing database...")
+    logger.info("🗄️  Initializing database...")
     
     try:
-        # Database initialization happens in db_service constructor
-        db_service.get_session().close()
-        print("✅ Database initialized successfully")
+        # Tables are created in the db_service constructor; this checks the
+        # database answers and opens the pool's first connection
+        await asyncio.to_thread(db_service.ping)
+        logger.info("✅ Database initialized successfully")
         return True
     except Exception as e:
-        print(f"❌ Database initialization failed: {str(e)}")
+        logger.error(f"❌ Database initialization failed: {str(e)}")
         return False
 
 async def initialize_vector_store():
     """Initialize vector store"""
-    print("🔍 Initializing vector store...")
+    logger.info("🔍 Initializing vector store...")
     
     try:
-        vector_service = MultimodalVectorStoreService()
-        print(f"✅ Vector store ({settings.VECTOR_DB_TYPE}) initialized successfully")
+        # Loads the process-wide store the app's services share
+        await asyncio.to_thread(get_vector_store_service)
+        logger.info(f"✅ Vector store ({settings.VECTOR_DB_TYPE}) initialized successfully")
         return True
     except Exception as e:
-        print(f"❌ Vector store initialization failed: {str(e)}")
+        logger.error(f"❌ Vector store initialization failed: {str(e)}")
         return False
 
 async def create_directories():
     """Create necessary directories"""
-    print("📁 Creating directories...")
+    logger.info("📁 Creating directories...")
     
     directories = [
         settings.UPLOAD_DIR,
@@ -86,75 +122,100 @@ async def create_directories():
         settings.CHROMA_PERSIST_DIRECTORY
     ]
     
-    for directory in directories:
-        Path(directory).mkdir(parents=True, exist_ok=True)
-        print(f"✅ Directory created: {directory}")
+    # Created together off the loop; logged in order afterwards
+    await asyncio.gather(*(
+        asyncio.to_thread(Path(directory).mkdir, parents=True, exist_ok=True)
+        for directory in directories
+    ))
+    
+    logger.info("\n".join(f"✅ Directory created: {directory}" for directory in directories))
     
     return True
 
 async def run_health_check():
     """Run comprehensive health check"""
-    print("🏥 Running health check...")
-    
-    checks = [
-        ("Dependencies", check_dependencies()),
-        ("Directories", create_directories()),
-        ("Database", initialize_database()),
-        ("Vector Store", initialize_vector_store()),
-        ("External Services", check_external_services())
+    logger.info("🏥 Running health check...")
+    
+    # Cheap local checks first; the vector store needs its directory
+    local_checks = [
+        ("Dependencies", check_dependencies),
+        ("Directories", create_directories)
     ]
     
     results = []
-    for name, check in checks:
-        print(f"\n🔍 {name}...")
-        result = await check
+    for name, check in local_checks:
+        logger.info(f"\n🔍 {name}...")
+        results.append((name, await check()))
+    
+    # Independent, latency-bound checks run together
+    remote_checks = [
+        ("Database", initialize_database),
+        ("Vector Store", initialize_vector_store),
+        ("External Services", check_external_services)
+    ]
+    
+    remote_results = await asyncio.gather(
+        *(asyncio.wait_for(check(), timeout=CHECK_TIMEOUT) for _, check in remote_checks),
+        return_exceptions=True
+    )
+    
+    for (name, _), result in zip(remote_checks, remote_results):
+        if isinstance(result, asyncio.TimeoutError):
+            logger.error(f"❌ {name} timed out after {CHECK_TIMEOUT}s")
+            result = False
+        elif isinstance(result, Exception):
+            logger.error(f"❌ {name} error: {str(result)}")
+            result = False
         results.append((name, result))
-        
-        if result:
-            print(f"✅ {name}: OK")
-        else:
-            print(f"❌ {name}: FAILED")
+    
+    # One record for the whole summary instead of a write per check
+    logger.info("\n".join(
+        f"✅ {name}: OK" if result else f"❌ {name}: FAILED"
+        for name, result in results
+    ))
     
     return all(result for _, result in results)
 
 def start_server():
     """Start the FastAPI server"""
-    print("\n🚀 Starting server...")
+    import uvicorn
+    logger.info("\n🚀 Starting server...")
     
-    cmd = [
-        sys.executable, "-m", "uvicorn",
-        "app.main:app",
-        "--host", "0.0.0.0",
-        "--port", "8000"
-    ]
+    # Served from this interpreter: uvicorn's reload and worker supervisors
+    # spawn their own children, and a single worker reuses loaded modules
+    options = {
+        "host": "0.0.0.0",
+        "port": 8000
+    }
     
     if settings.DEBUG:
-        cmd.extend(["--reload", "--log-level", "debug"])
+        options.update(reload=True, reload_dirs=[str(project_root)], log_level="debug")
     else:
-        cmd.extend(["--workers", "4", "--log-level", "info"])
+        options.update(workers=server_workers(), log_level="info")
     
     try:
-        subprocess.run(cmd, cwd=project_root)
+        uvicorn.run("app.main:app", **options)
     except KeyboardInterrupt:
-        print("\n⏹️  Server stopped by user")
+        logger.info("\n⏹️  Server stopped by user")
     except Exception as e:
-        print(f"❌ Server error: {str(e)}")
+        logger.error(f"❌ Server error: {str(e)}")
 
 async def main():
     """Main startup function"""
-    print(f"🎯 Starting {settings.PROJECT_NAME} v{settings.VERSION}")
-    print("=" * 50)
-    
-    # Run health check
-    if await run_health_check():
-        print("\n🎉 All systems ready!")
-        print("=" * 50)
-        
-        # Start server
-        start_server()
-    else:
-        print("\n💥 Startup failed! Please fix the issues above.")
-        sys.exit(1)
+    logger.info(f"🎯 Starting {settings.PROJECT_NAME} v{settings.VERSION}")
+    logger.info("=" * 50)
+    
+    # The app initializes its services after binding and reports progress
+    # on /health/ready, so the full check only runs when asked for
+    if "--check" in sys.argv:
+        if not await run_health_check():
+            logger.error("\n💥 Startup failed! Please fix the issues above.")
+            sys.exit(1)
+        logger.info("\n🎉 All systems ready!")
+        logger.info("=" * 50)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    logging.basicConfig(format="%(message)s", stream=sys.stdout, level=logging.INFO)
+    asyncio.run(main())
+    # uvicorn runs its own event loop, so start it after the checks' loop closes
+    start_server()
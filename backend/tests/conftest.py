@@ -0,0 +1,20 @@
+import asyncio
+import os
+import pytest
+
+@pytest.fixture(scope="session")
+def event_loop():
+    """One event loop shared by every async test in the session"""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+# Autouse so every xdist worker process sets the test environment once
+@pytest.fixture(scope="session", autouse=True)
+def test_config():
+    """Test configuration"""
+    os.environ.update({
+        "EURI_API_KEY": "test-key",
+        "VECTOR_DB_TYPE": "chroma",
+        "DATABASE_URL": "sqlite:///test.db"
+    })
@@ -1,23 +1,26 @@
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import patch, Mock
-import tempfile
-import os
+from io import BytesIO
 
 from app.main import app
 
-client = TestClient(app)
+@pytest.fixture(scope="session")
+def client():
+    # Entering the client runs the app's lifespan once for the whole session
+    with TestClient(app) as test_client:
+        yield test_client
 
 class TestChatAPI:
     
-    def test_health_check(self):
+    def test_health_check(self, client):
         """Test health check endpoint"""
         response = client.get("/health")
         assert response.status_code == 200
         assert response.json()["status"] == "healthy"
     
     @patch('app.api.routes.chat.rag_graph')
-    def test_chat_endpoint(self, mock_rag_graph):
+    def test_chat_endpoint(self, mock_rag_graph, client):
         """Test chat endpoint"""
         # Mock RAG graph response
         mock_rag_graph.process_query.return_value = {
@@ -37,7 +40,7 @@ class TestChatAPI:
         assert data["response"] == "Test response"
         assert "sources" in data
     
-    def test_chat_endpoint_invalid_request(self):
+    def test_chat_endpoint_invalid_request(self, client):
         """Test chat endpoint with invalid request"""
         response = client.post(
             "/api/v1/chat/chat",
@@ -48,9 +51,10 @@ class TestChatAPI:
 
 class TestUploadAPI:
     
+    @pytest.mark.serial
     @patch('app.services.pdf_processor.MultimodalPDFProcessor.process_pdf')
     @patch('app.services.vector_store.MultimodalVectorStoreService.add_multimodal_content')
-    def test_upload_pdf(self, mock_add_content, mock_process_pdf):
+    def test_upload_pdf(self, mock_add_content, mock_process_pdf, client):
         """Test PDF upload endpoint"""
         # Mock processing results
         mock_process_pdf.return_value = {
@@ -60,35 +64,23 @@ class TestUploadAPI:
             "images": []
         }
         
-        # Create temporary PDF file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-            tmp.write(b'%PDF-1.4 test content')
-            tmp.seek(0)
-            
-            response = client.post(
-                "/api/v1/upload/upload",
-                files={"file": ("test.pdf", tmp, "application/pdf")}
-            )
-        
-        os.unlink(tmp.name)  # Clean up
+        # In-memory PDF stub; the upload only needs a file-like object
+        response = client.post(
+            "/api/v1/upload/upload",
+            files={"file": ("test.pdf", BytesIO(b'%PDF-1.4 test content'), "application/pdf")}
+        )
         
         assert response.status_code == 200
         data = response.json()
         assert data["filename"] == "test.pdf"
         assert data["page_count"] == 10
     
-    def test_upload_invalid_file_type(self):
+    def test_upload_invalid_file_type(self, client):
         """Test upload with invalid file type"""
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.txt') as tmp:
-            tmp.write(b'text content')
-            tmp.seek(0)
-            
-            response = client.post(
-                "/api/v1/upload/upload",
-                files={"file": ("test.txt", tmp, "text/plain")}
-            )
-        
-        os.unlink(tmp.name)
+        response = client.post(
+            "/api/v1/upload/upload",
+            files={"file": ("test.txt", BytesIO(b'text content'), "text/plain")}
+        )
         
         assert response.status_code == 400
 
@@ -96,10 +88,10 @@ class TestAnalyticsAPI:
     
     @patch('app.services.llm_service.AdvancedLLMService.analyze_trends')
     @patch('app.services.vector_store.MultimodalVectorStoreService')
-    def test_analytics_endpoint(self, mock_vector_service, mock_analyze_trends):
+    def test_analytics_endpoint(self, mock_vector_service, mock_analyze_trends, client):
         """Test analytics endpoint"""
         # Mock vector search results
-        mock_vector_service.table_store.similarity_search.return_value = []
+        mock_vector_service.store.similarity_search.return_value = []
         
         # Mock trend analysis
         mock_analyze_trends.return_value = {
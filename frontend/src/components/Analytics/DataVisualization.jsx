@@ -3,7 +3,7 @@ import Plot from 'react-plotly.js';
 import { BarChart3, Download, Settings } from 'lucide-react';
 
 const DataVisualization = ({ chartData }) => {
-  if (!chartData || !chartData.plotly_json) {
+  if (!chartData || !chartData.plotly_spec) {
     return (
       <div className="bg-white p-6 rounded-lg border">
         <h3 className="text-lg font-semibold mb-4 flex items-center">
@@ -22,7 +22,7 @@ const DataVisualization = ({ chartData }) => {
   }
 
   try {
-    const plotData = JSON.parse(chartData.plotly_json);
+    const plotData = chartData.plotly_spec;
     
     return (
       <div className="bg-white p-6 rounded-lg border">
@@ -48,16 +48,16 @@ const ChatInterface = ({ messages, onSendMessage, loading, currentDocument }) =>
               </div>
 
               {/* Chart Display */}
-              {chartData && chartData.plotly_json && (
+              {chartData && chartData.plotly_spec && (
                 <div className="border rounded-lg p-4 bg-gray-50">
                   <h4 className="text-sm font-semibold mb-2 flex items-center">
                     <BarChart3 className="w-4 h-4 mr-2" />
                     Data Visualization
                   </h4>
                   <Plot
-                    data={JSON.parse(chartData.plotly_json).data}
+                    data={chartData.plotly_spec.data}
                     layout={{
-                      ...JSON.parse(chartData.plotly_json).layout,
+                      ...chartData.plotly_spec.layout,
                       autosize: true,
                       height: 400
                     }}
@@ -85,10 +85,10 @@ describe('ChatInterface', () => {
         type: 'assistant',
         content: 'Here is your chart',
         chartData: {
-          plotly_json: JSON.stringify({
+          plotly_spec: {
             data: [{ y: [1, 2, 3], type: 'scatter' }],
             layout: { title: 'Test Chart' }
-          })
+          }
         },
         timestamp: new Date()
       }